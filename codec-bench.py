@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+
+# First off, read the arguments
+parser = argparse.ArgumentParser(
+    description='Measure the cost of encoding and decoding job data.')
+
+parser.add_argument('--sizes', dest='sizes', default='10,100,1000,10000',
+    help='Comma-separated numbers of records in each payload')
+parser.add_argument('--iterations', dest='iterations', default=0, type=int,
+    help='How many times to encode and decode each payload (0 to scale)')
+parser.add_argument('--codecs', dest='codecs', default=None,
+    help='Comma-separated codecs to measure (default is all available)')
+
+args = parser.parse_args()
+
+import timeit
+from qless.codec import Codecs
+
+codecs = Codecs()
+names = (args.codecs and args.codecs.split(',')) or list(codecs)
+
+
+def payload(size):
+    '''A payload resembling typical job data, with `size` records'''
+    return {
+        'account': 12345,
+        'records': [{
+            'id': index,
+            'url': 'http://example.com/page/%i' % index,
+            'score': index / 7.0,
+            'tags': ['foo', 'bar', 'baz'],
+            'seen': index % 2 == 0
+        } for index in range(size)]
+    }
+
+
+print('%8s | %8s | %10s | %14s | %14s' % (
+    'Records', 'Codec', 'Bytes', 'Encode (us)', 'Decode (us)'))
+print('-' * 66)
+for size in [int(size) for size in args.sizes.split(',')]:
+    data = payload(size)
+    iterations = args.iterations or max(10, 100000 // size)
+    for name in names:
+        raw = codecs.dumps(data, name)
+        assert codecs.loads(raw) == data
+        encode = timeit.timeit(
+            lambda: codecs.dumps(data, name), number=iterations)
+        decode = timeit.timeit(lambda: codecs.loads(raw), number=iterations)
+        print('%8i | %8s | %10i | %14.2f | %14.2f' % (
+            size, name, len(raw),
+            encode * 1e6 / iterations, decode * 1e6 / iterations))
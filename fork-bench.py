@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+
+# First off, read the arguments
+parser = argparse.ArgumentParser(
+    description='Measure the startup time and memory of forked workers.')
+
+parser.add_argument('--children', dest='children', default=4, type=int,
+    help='How many children to fork')
+parser.add_argument('--objects', dest='objects', default=200000, type=int,
+    help='How many objects the job module allocates when imported')
+parser.add_argument('--module', dest='modules', action='append', default=[],
+    help='Other modules for the job module to import')
+
+args = parser.parse_args()
+
+import gc
+import os
+import sys
+import time
+import shutil
+import tempfile
+import simplejson as json
+
+from qless.job import BaseJob
+from qless.workers.forking import ForkingWorker
+
+# A job module that's expensive to import, like one with heavy dependencies
+path = tempfile.mkdtemp()
+sys.path.insert(0, path)
+with open(os.path.join(path, 'benchjobs.py'), 'w') as fout:
+    fout.write('''
+%s
+RECORDS = [{'id': index, 'name': 'record-%%i' %% index, 'values': [index]}
+    for index in range(%i)]
+
+class BenchJob(object):
+    @staticmethod
+    def process(job):
+        pass
+''' % ('\n'.join('import ' + module for module in args.modules), args.objects))
+
+
+def memory():
+    '''The resident and private memory of this process, in kB'''
+    rss, private = 0, 0
+    with open('/proc/self/smaps_rollup') as fin:
+        for line in fin:
+            if line.startswith('Rss:'):
+                rss = int(line.split()[1])
+            elif line.startswith('Private_'):
+                private += int(line.split()[1])
+    return rss, private
+
+
+def child(pipe, forked):
+    '''Import the job class as a worker would, and then collect as one
+    eventually does, reporting how long and how much memory that took'''
+    BaseJob._import('benchjobs.BenchJob')
+    started = time.time() - forked
+    gc.collect()
+    rss, private = memory()
+    os.write(pipe, json.dumps([started, rss, private]).encode('utf-8'))
+    os._exit(0)
+
+
+def measure(preload, freeze):
+    '''Fork the children from a fresh process, and report their averages'''
+    read, write = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(read)
+        if preload:
+            worker = ForkingWorker([], None, preload=['benchjobs.BenchJob'])
+            if freeze:
+                worker.load()
+            else:
+                BaseJob._import('benchjobs.BenchJob')
+        results = []
+        for _ in range(args.children):
+            inner, outer = os.pipe()
+            forked = time.time()
+            if not os.fork():
+                os.close(inner)
+                child(outer, forked)
+            os.close(outer)
+            results.append(json.loads(os.read(inner, 1024)))
+            os.close(inner)
+            os.wait()
+        os.write(write, json.dumps(results).encode('utf-8'))
+        os._exit(0)
+    os.close(write)
+    data = b''
+    chunk = os.read(read, 65536)
+    while chunk:
+        data += chunk
+        chunk = os.read(read, 65536)
+    os.close(read)
+    os.waitpid(pid, 0)
+    results = json.loads(data)
+    return [sum(values) / len(values) for values in zip(*results)]
+
+
+# Private memory is what each child doesn't share with the parent or its
+# siblings, and is what each additional child costs
+try:
+    print('%10s | %12s | %10s | %12s' % (
+        'Mode', 'Startup (ms)', 'RSS (kB)', 'Private (kB)'))
+    print('-' * 54)
+    for name, preload, freeze in (
+        ('cold', False, False),
+        ('preload', True, False),
+        ('freeze', True, True)):
+        if freeze and not hasattr(gc, 'freeze'):
+            print('%10s | gc.freeze requires Python 3.7' % name)
+            continue
+        started, rss, private = measure(preload, freeze)
+        print('%10s | %12.2f | %10i | %12i' % (
+            name, started * 1000, rss, private))
+finally:
+    shutil.rmtree(path)
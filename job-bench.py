@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+
+# First off, read the arguments
+parser = argparse.ArgumentParser(
+    description='Compare the memory and latency of job representations.')
+
+parser.add_argument('--jobs', dest='numJobs', default=100000, type=int,
+    help='How many jobs to hold in memory')
+parser.add_argument('--history', dest='history', default=5, type=int,
+    help='How many history entries each job has')
+
+args = parser.parse_args()
+
+import gc
+import sys
+import time
+import tracemalloc
+import simplejson as json
+
+import qless
+from qless.job import Job
+
+
+class DictJob(object):
+    '''Jobs as they were represented before they used slots and decoded their
+    fields lazily, for comparison'''
+    def __init__(self, client, **kwargs):
+        object.__setattr__(self, 'client', client)
+        for att in ['jid', 'priority', 'state', 'tracked', 'failure',
+            'history']:
+            object.__setattr__(self, att, kwargs[att])
+        object.__setattr__(self, 'klass_name', kwargs['klass'])
+        object.__setattr__(self, 'queue_name', kwargs['queue'])
+        object.__setattr__(self, 'tags', kwargs['tags'] or [])
+        object.__setattr__(self, 'data', json.loads(kwargs['data']))
+        object.__setattr__(self, 'expires_at', kwargs['expires'])
+        object.__setattr__(self, 'original_retries', kwargs['retries'])
+        object.__setattr__(self, 'retries_left', kwargs['remaining'])
+        object.__setattr__(self, 'worker_name', kwargs['worker'])
+        object.__setattr__(self, 'dependents', kwargs['dependents'] or [])
+        object.__setattr__(self, 'dependencies', kwargs['dependencies'] or [])
+
+    def __setattr__(self, key, value):
+        if key == 'priority':
+            raise NotImplementedError('Not for benchmarking')
+        return object.__setattr__(self, key, value)
+
+    def __getattr__(self, key):
+        if key == 'ttl':
+            return self.expires_at - time.time()
+        raise AttributeError(key)
+
+
+# A response like the one from `multiget`, not yet decoded
+response = json.dumps([{
+    'jid': '%032x' % index,
+    'klass': 'gnomes.GnomesJob',
+    'queue': 'underpants',
+    'state': 'waiting',
+    'priority': 0,
+    'tags': ['foo', 'bar'],
+    'tracked': False,
+    'data': json.dumps({'account': index, 'urls': ['http://example.com/'] * 5}),
+    'expires': 0,
+    'retries': 5,
+    'remaining': 5,
+    'worker': '',
+    'failure': {},
+    'dependents': {},
+    'dependencies': {},
+    'history': [{'what': 'put', 'when': time.time(), 'q': 'underpants'}] * (
+        args.history)
+} for index in range(args.numJobs)])
+client = qless.Client(hostname='bench')
+
+
+def footprint(job):
+    '''The size of the job object itself, excluding the values it holds
+    except for the encoded data it keeps until it's decoded'''
+    size = sys.getsizeof(job)
+    if not hasattr(type(job), '__slots__'):
+        size += sys.getsizeof(job.__dict__)
+    if getattr(job, '_raw_data', None) is not None:
+        size += sys.getsizeof(job._raw_data)
+    return size
+
+
+def measure(klass):
+    '''Build all the jobs, and then read their jid, state and data'''
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    jobs = [klass(client, **job) for job in json.loads(response)]
+    built = time.time() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    size = footprint(jobs[0])
+
+    start = time.time()
+    for job in jobs:
+        job.jid, job.state, job.ttl
+    listed = time.time() - start
+
+    start = time.time()
+    for job in jobs:
+        job.data
+    read = time.time() - start
+    return built, memory, size, listed, read
+
+
+# Memory is everything allocated per job, including the decoded response,
+# while the object is the size of the job object alone
+print('%8s | %11s | %11s | %11s | %10s | %10s' % ('Class', 'Build (us)',
+    'Memory (B)', 'Object (B)', 'List (us)', 'Data (us)'))
+print('-' * 76)
+for klass in (DictJob, Job):
+    built, memory, size, listed, read = measure(klass)
+    print('%8s | %11.2f | %11i | %11i | %10.3f | %10.3f' % (klass.__name__,
+        built * 1e6 / args.numJobs, memory / args.numJobs, size,
+        listed * 1e6 / args.numJobs, read * 1e6 / args.numJobs))
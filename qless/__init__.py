@@ -2,13 +2,12 @@
 
 import time
 import redis
-import pkgutil
 import logging
 import decorator
 import simplejson as json
 import sys
 
-from six import PY3
+from six import PY3, string_types
 
 # Internal imports
 from .exceptions import QlessException
@@ -47,28 +46,53 @@ class Jobs(object):
         '''Return the paginated jids of complete jobs'''
         return self.client('jobs', 'complete', offset, count)
 
+    def iter_complete(self, count=100, hydrate=False):
+        '''Iterate over the jids of all complete jobs, or over the jobs
+        themselves if `hydrate`, fetching `count` at a time'''
+        return paginate(self.complete, count, hydrate and self._hydrate)
+
     def tracked(self):
         '''Return an array of job objects that are being tracked'''
         results = json.loads(self.client('track'))
-        results['jobs'] = [Job(self, **job) for job in results['jobs']]
+        results['jobs'] = [
+            Job(self.client, **job) for job in results['jobs']]
         return results
 
     def tagged(self, tag, offset=0, count=25):
         '''Return the paginated jids of jobs tagged with a tag'''
-        return json.loads(self.client('tag', 'get', tag, offset, count))
+        return json.loads(self.client.read('tag', 'get', tag, offset, count))
+
+    def iter_tagged(self, tag, count=100, hydrate=False):
+        '''Iterate over the jids of all jobs tagged with a tag, or over the
+        jobs themselves if `hydrate`, fetching `count` at a time'''
+        return paginate(
+            lambda offset, count: self.tagged(tag, offset, count)['jobs'],
+            count, hydrate and self._hydrate)
 
     def failed(self, group=None, start=0, limit=25):
         '''If no group is provided, this returns a JSON blob of the counts of
         the various types of failures known. If a type is provided, returns
         paginated job objects affected by that kind of failure.'''
         if not group:
-            return json.loads(self.client('failed'))
+            return json.loads(self.client.read('failed'))
         else:
             results = json.loads(
-                self.client('failed', group, start, limit))
+                self.client.read('failed', group, start, limit))
             results['jobs'] = self.get(*results['jobs'])
             return results
 
+    def iter_failed(self, group, count=100, hydrate=False):
+        '''Iterate over the jids of all jobs with a kind of failure, or over
+        the jobs themselves if `hydrate`, fetching `count` at a time'''
+        return paginate(
+            lambda start, limit: json.loads(
+                self.client.read('failed', group, start, limit))['jobs'],
+            count, hydrate and self._hydrate)
+
+    def _hydrate(self, jids):
+        '''The jobs for a page of jids'''
+        return self.get(*jids)
+
     def get(self, *jids):
         '''Return jobs objects for all the jids'''
         if jids:
@@ -77,16 +101,34 @@ class Jobs(object):
                 json.loads(self.client('multiget', *jids))]
         return []
 
+    def lookup(self, *jids):
+        '''Return a job or recurring job object for each of the jids, or
+        ``None`` for those that don't exist, in a single round trip'''
+        with self.client.batch() as batch:
+            futures = self._lookup(batch, jids)
+        return [self._resolve(*pair) for pair in futures]
+
+    def _lookup(self, batch, jids):
+        '''Add a get and a recur.get for each of the jids to the batch'''
+        return [(batch('get', jid), batch('recur.get', jid)) for jid in jids]
+
+    def _resolve(self, job, recurring):
+        '''The job or recurring job that a flushed pair of lookups found, or
+        ``None``'''
+        if job.result():
+            return Job(self.client, **json.loads(job.result()))
+        if recurring.result():
+            return RecurringJob(self.client, **json.loads(recurring.result()))
+        return None
+
     def __getitem__(self, jid):
         '''Get a job object corresponding to that jid, or ``None`` if it
         doesn't exist'''
-        results = self.client('get', jid)
-        if not results:
-            results = self.client('recur.get', jid)
-            if not results:
-                return None
-            return RecurringJob(self.client, **json.loads(results))
-        return Job(self.client, **json.loads(results))
+        return self.lookup(jid)[0]
+
+    def bulk(self, jids, chunk_size=500, progress=None):
+        '''Operations on many jobs at once, sent in chunks of `chunk_size`'''
+        return Bulk(self.client, jids, chunk_size, progress)
 
 
 class Workers(object):
@@ -127,24 +169,45 @@ class Queues(object):
 
 
 class Client(object):
-    '''Basic qless client object.'''
-    def __init__(self, url='redis://localhost:6379', hostname=None, **kwargs):
+    '''Basic qless client object. If a `replica` URL is provided, read-only
+    commands are sent there instead, so long as it's replicating and has
+    heard from its primary within `max_staleness` seconds. If `config_ttl` is
+    provided, the config is cached for up to that many seconds.'''
+    # How often to check on the state of the replica, in seconds
+    replica_check_interval = 1
+
+    def __init__(self, url='redis://localhost:6379', hostname=None,
+        codec='json', replica=None, max_staleness=15, config_ttl=None,
+        **kwargs):
         import socket
         # This is our unique idenitifier as a worker
         self.worker_name = hostname or socket.gethostname()
+        # How we encode job data. Any registered codec can decode it
+        self.codecs = Codecs(codec)
         if PY3:
             kwargs['decode_responses'] = True
         # This is just the redis instance we're connected to conceivably
         # someone might want to work with multiple instances simultaneously.
         self.redis = redis.Redis.from_url(url, **kwargs)
+        # An optional replica for read-only commands
+        self.replica = replica and redis.Redis.from_url(replica, **kwargs)
+        self.max_staleness = max_staleness
+        self._replica_checked = 0
+        self._replica_fresh = False
+        # Which queue round-robin pops start from next
+        self._turn = -1
+        # The ShardedClient this is a shard of, if any, so that jobs moving
+        # to another queue can be sent to the instance it lives on
+        self.sharded = None
         self.jobs = Jobs(self)
         self.queues = Queues(self)
-        self.config = Config(self)
+        self.config = Config(self, config_ttl)
         self.workers = Workers(self)
 
-        # We now have a single unified core script.
-        data = pkgutil.get_data('qless', 'qless-core/qless.lua')
-        self._lua = self.redis.register_script(data)
+        # We now have a single unified core script. It's only read and loaded
+        # into Redis when the first command is sent
+        self._lua = Script(self.redis)
+        self._replica_lua = self.replica and Script(self.replica)
 
     def __getattr__(self, key):
         if key == 'events':
@@ -153,14 +216,70 @@ class Client(object):
         raise AttributeError('%s has no attribute %s' % (
             self.__class__.__module__ + '.' + self.__class__.__name__, key))
 
-    def __call__(self, command, *args):
+    def _args(self, command, *args):
+        '''The arguments to the qless-core script for this command'''
         lua_args = [command, repr(time.time())]
         lua_args.extend(args)
+        return lua_args
+
+    def __call__(self, command, *args):
         try:
-            return self._lua(keys=[], args=lua_args)
+            return self._lua(self._args(command, *args))
         except redis.ResponseError as exc:
             raise QlessException(str(exc))
 
+    def read(self, command, *args):
+        '''Run a read-only command, on the replica if it's fresh enough, and
+        otherwise on the primary. Only commands that never write, even as a
+        side effect (like `peek`, `workers` and `queues` do), should be sent
+        this way'''
+        if self.replica and self._fresh():
+            try:
+                return self._replica_lua(self._args(command, *args))
+            except (redis.ConnectionError, redis.TimeoutError):
+                logger.debug('Replica unavailable for %s, using primary',
+                    command)
+            except redis.ResponseError as exc:
+                # Before Redis 7, this is wrapped in the script's error
+                if 'READONLY' not in str(exc):
+                    raise QlessException(str(exc))
+                # Perhaps the replica was reconfigured to refuse scripts
+                logger.debug('Replica refused %s, using primary', command)
+        return self(command, *args)
+
+    def _fresh(self):
+        '''Whether the replica is replicating, and recently enough'''
+        now = time.time()
+        if now - self._replica_checked > self.replica_check_interval:
+            self._replica_checked = now
+            try:
+                info = self.replica.info('replication')
+                if info.get('role') == 'master':
+                    # It's its own primary, so it can't be behind
+                    self._replica_fresh = True
+                else:
+                    lag = info.get('master_last_io_seconds_ago', -1)
+                    self._replica_fresh = (
+                        info.get('master_link_status') == 'up' and
+                        0 <= lag <= self.max_staleness)
+            except redis.RedisError:
+                self._replica_fresh = False
+            if not self._replica_fresh:
+                logger.debug('Replica is stale, using primary')
+        return self._replica_fresh
+
+    def batch(self):
+        '''A batch that sends the commands it's given in one round trip'''
+        return Batch(self)
+
+    def pop_many(self, queues, count=1, strategy='priority', weights=None):
+        '''Pop up to `count` jobs from the named queues, in as few as one
+        round trip. See ``qless.queue.pop_many`` for the strategies'''
+        self._turn += 1
+        return pop_many([self.queues[queue] if isinstance(queue, string_types)
+            else queue for queue in queues],
+            count, strategy, weights, self._turn)
+
     def track(self, jid):
         '''Begin tracking this job'''
         return self('track', 'track', jid)
@@ -178,6 +297,13 @@ class Client(object):
         return self('unfail', queue, group, count)
 
 from .job import Job, RecurringJob
-from .queue import Queue
+from .queue import Queue, pop_many
 from .config import Config
 from .listener import Events
+from .batch import Batch, Future
+from .bulk import Bulk
+from .codec import Codecs
+from .failures import FailureScanner
+from .script import Script
+from .sharding import ShardedClient
+from .util import paginate
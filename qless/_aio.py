@@ -0,0 +1,446 @@
+'''The asyncio client for ``qless.aio``, whose coroutine functions can't be
+defined before Python 3.5'''
+
+import time
+import uuid
+import socket
+import simplejson as json
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import ResponseError
+except ImportError:  # pragma: no cover
+    aioredis = None
+
+# Internal imports
+from qless import logger
+from qless.codec import Codecs
+from qless.script import Script
+from qless.exceptions import QlessException, LostLockException
+from qless import job as _job, queue as _queue, listener as _listener
+
+
+class Jobs(object):
+    '''Class for accessing jobs and job information'''
+    def __init__(self, client):
+        self.client = client
+
+    async def get(self, *jids):
+        '''Return jobs objects for all the jids'''
+        if jids:
+            return [
+                Job(self.client, **j) for j in
+                json.loads(await self.client('multiget', *jids))]
+        return []
+
+    async def lookup(self, *jids):
+        '''Return a job or recurring job object for each of the jids, or
+        ``None`` for those that don't exist, in a single round trip'''
+        results = await self.client.pipelined([(command, jid)
+            for jid in jids for command in ('get', 'recur.get')])
+        found = []
+        for job, recurring in zip(results[::2], results[1::2]):
+            if job:
+                found.append(Job(self.client, **json.loads(job)))
+            elif recurring:
+                found.append(
+                    RecurringJob(self.client, **json.loads(recurring)))
+            else:
+                found.append(None)
+        return found
+
+    async def __getitem__(self, jid):
+        '''Get a job object corresponding to that jid, or ``None`` if it
+        doesn't exist'''
+        return (await self.lookup(jid))[0]
+
+
+class Queues(object):
+    '''Class for accessing queues'''
+    def __init__(self, client):
+        self.client = client
+
+    async def counts(self):
+        '''What queues are there, and how many jobs do they have running,
+        waiting, scheduled, etc.'''
+        return json.loads(await self.client('queues'))
+
+    def __getitem__(self, queue_name):
+        '''Get a queue object associated with the provided queue name'''
+        return Queue(queue_name, self.client, self.client.worker_name)
+
+
+class Queue(object):
+    '''The asyncio Queue class'''
+    class_string = _queue.Queue.class_string
+    _put_args = _queue.Queue._put_args
+
+    def __init__(self, name, client, worker_name):
+        self.name = name
+        self.client = client
+        self.worker_name = worker_name
+
+    async def counts(self):
+        '''How many jobs this queue has running, waiting, scheduled, etc.'''
+        return json.loads(await self.client('queues', self.name))
+
+    async def length(self):
+        '''The number of jobs in this queue'''
+        return await self.client('length', self.name)
+
+    async def pause(self):
+        return await self.client('pause', self.name)
+
+    async def unpause(self):
+        return await self.client('unpause', self.name)
+
+    async def put(self, klass, data, priority=None, tags=None, delay=None,
+        retries=None, jid=None, depends=None):
+        '''Just like ``qless.Queue.put``'''
+        return await self.client(*self._put_args(klass, data, priority, tags,
+            delay, retries, jid, depends))
+
+    async def recur(self, klass, data, interval, offset=0, priority=None,
+        tags=None, retries=None, jid=None):
+        '''Place a recurring job in this queue'''
+        return await self.client('recur', self.name,
+            jid or uuid.uuid4().hex,
+            self.class_string(klass),
+            self.client.codecs.dumps(data),
+            'interval', interval, offset,
+            'priority', priority or 0,
+            'tags', json.dumps(tags or []),
+            'retries', retries or 5
+        )
+
+    async def pop(self, count=None):
+        '''Just like ``qless.Queue.pop``'''
+        results = [Job(self.client, **job) for job in json.loads(
+            await self.client('pop', self.name, self.worker_name, count or 1))]
+        if count == None:
+            return (len(results) and results[0]) or None
+        return results
+
+    async def peek(self, count=None):
+        '''Just like ``qless.Queue.peek``'''
+        results = [Job(self.client, **rec) for rec in json.loads(
+            await self.client('peek', self.name, count or 1))]
+        if count == None:
+            return (len(results) and results[0]) or None
+        return results
+
+    async def stats(self, date=None):
+        '''Just like ``qless.Queue.stats``'''
+        return json.loads(
+            await self.client('stats', self.name, date or repr(time.time())))
+
+
+class Job(_job.Job):
+    '''A job whose operations are coroutines'''
+    def __setattr__(self, key, value):
+        if key == 'priority':
+            raise AttributeError(
+                'Use `await job.set_priority(%s)` with the asyncio client' % (
+                    value))
+        return object.__setattr__(self, key, value)
+
+    async def set_priority(self, priority):
+        '''Set the priority of this job'''
+        return await self.client('priority', self.jid, priority
+            ) and object.__setattr__(self, 'priority', priority)
+
+    async def cancel(self):
+        '''Cancel a job'''
+        return await self.client('cancel', self.jid)
+
+    async def tag(self, *tags):
+        '''Tag a job with additional tags'''
+        return await self.client('tag', 'add', self.jid, *tags)
+
+    async def untag(self, *tags):
+        '''Remove tags from a job'''
+        return await self.client('tag', 'remove', self.jid, *tags)
+
+    async def move(self, queue, delay=0, depends=None):
+        '''Just like ``qless.Job.move``'''
+        logger.info('Moving %s to %s from %s',
+            self.jid, queue, self.queue_name)
+        return await self.client('put', queue, self.jid, self.klass_name,
+            self._encoded_data(), delay,
+            'depends', json.dumps(depends or [])
+        )
+
+    async def complete(self, nextq=None, delay=None, depends=None):
+        '''Just like ``qless.Job.complete``'''
+        if nextq:
+            logger.info('Advancing %s to %s from %s',
+                self.jid, nextq, self.queue_name)
+            return await self.client('complete', self.jid,
+                self.client.worker_name, self.queue_name,
+                self._encoded_data(), 'next', nextq,
+                'delay', delay or 0, 'depends', json.dumps(depends or [])
+            ) or False
+        else:
+            logger.info('Completing %s', self.jid)
+            return await self.client('complete', self.jid,
+                self.client.worker_name, self.queue_name,
+                self._encoded_data()) or False
+
+    async def heartbeat(self):
+        '''Just like ``qless.Job.heartbeat``'''
+        logger.debug('Heartbeating %s (ttl = %s)', self.jid, self.ttl)
+        try:
+            self.expires_at = float(await self.client('heartbeat', self.jid,
+                self.client.worker_name, self._encoded_data()
+            ) or 0)
+        except QlessException:
+            raise LostLockException(self.jid)
+        logger.debug('Heartbeated %s (ttl = %s)', self.jid, self.ttl)
+        return self.expires_at
+
+    async def fail(self, group, message):
+        '''Just like ``qless.Job.fail``'''
+        logger.warn('Failing %s (%s): %s', self.jid, group, message)
+        return await self.client('fail', self.jid, self.client.worker_name,
+            group, message, self._encoded_data()) or False
+
+    async def track(self):
+        '''Begin tracking this job'''
+        return await self.client('track', 'track', self.jid)
+
+    async def untrack(self):
+        '''Stop tracking this job'''
+        return await self.client('track', 'untrack', self.jid)
+
+    async def retry(self, delay=0):
+        '''Just like ``qless.Job.retry``'''
+        return await self.client('retry', self.jid, self.queue_name,
+            self.worker_name, delay)
+
+    async def depend(self, *args):
+        '''Just like ``qless.Job.depend``'''
+        return await self.client('depends', self.jid, 'on', *args) or False
+
+    async def undepend(self, *args, **kwargs):
+        '''Just like ``qless.Job.undepend``'''
+        if kwargs.get('all', False):
+            return await self.client(
+                'depends', self.jid, 'off', 'all') or False
+        return await self.client('depends', self.jid, 'off', *args) or False
+
+    async def timeout(self):
+        '''Time out this job'''
+        await self.client('timeout', self.jid)
+
+    def process(self):
+        '''Not available with the asyncio client, since failing a job is a
+        coroutine. Jobs with coroutine methods are run by
+        ``qless.workers.aio.AsyncioWorker``'''
+        raise NotImplementedError(
+            'Jobs from the asyncio client cannot be processed in place')
+
+    def _method(self, coroutine=False):
+        '''Not available with the asyncio client, for the same reason'''
+        raise NotImplementedError(
+            'Jobs from the asyncio client cannot be processed in place')
+
+
+class RecurringJob(_job.RecurringJob):
+    '''A recurring job whose operations are coroutines. Since assignments
+    can't be awaited, its attributes are updated with the ``set_`` methods:
+
+        await job.set_interval(60)'''
+
+    def __setattr__(self, key, value):
+        if key in ('priority', 'retries', 'interval', 'data', 'klass'):
+            raise AttributeError(
+                'Use `await job.set_%s(...)` with the asyncio client' % key)
+        return object.__setattr__(self, key, value)
+
+    def __getattr__(self, key):
+        if key == 'next':
+            raise AttributeError(
+                'Use `await job.next_run()` with the asyncio client')
+        return _job.RecurringJob.__getattr__(self, key)
+
+    async def _update(self, key, value):
+        '''Update an attribute of this recurring job'''
+        return await self.client('recur.update', self.jid, key, value)
+
+    async def set_priority(self, priority):
+        '''Set the priority of the jobs this spawns'''
+        return await self._update('priority', priority
+            ) and object.__setattr__(self, 'priority', priority)
+
+    async def set_retries(self, retries):
+        '''Set how many times the jobs this spawns may be retried'''
+        return await self._update('retries', retries
+            ) and object.__setattr__(self, 'retries', retries)
+
+    async def set_interval(self, interval):
+        '''Set how often this spawns a job, in seconds'''
+        return await self._update('interval', interval
+            ) and object.__setattr__(self, 'interval', interval)
+
+    async def set_data(self, data):
+        '''Set the data of the jobs this spawns'''
+        return await self._update('data', self.client.codecs.dumps(data)
+            ) and object.__setattr__(self, 'data', data)
+
+    async def set_klass(self, klass):
+        '''Set the class of the jobs this spawns'''
+        name = klass.__module__ + '.' + klass.__name__
+        result = await self._update('klass', name)
+        if result:
+            object.__setattr__(self, 'klass_name', name)
+            object.__setattr__(self, 'klass', klass)
+        return result
+
+    async def next_run(self):
+        '''The time (seconds since epoch) of the next job this spawns'''
+        return await self.client.redis.zscore(
+            'ql:q:' + self.queue_name + '-recur', self.jid)
+
+    async def move(self, queue):
+        '''Just like ``qless.RecurringJob.move``'''
+        return await self._update('queue', queue)
+
+    async def cancel(self):
+        '''Cancel all future recurring jobs'''
+        await self.client('unrecur', self.jid)
+
+    async def tag(self, *tags):
+        '''Add tags to this recurring job'''
+        return await self.client('recur.tag', self.jid, *tags)
+
+    async def untag(self, *tags):
+        '''Remove tags from this recurring job'''
+        return await self.client('recur.untag', self.jid, *tags)
+
+
+class Config(object):
+    '''Access to the qless config. Since every access is a round trip, this
+    has coroutine methods rather than the mapping interface of
+    ``qless.Config``'''
+    def __init__(self, client):
+        self._client = client
+
+    async def all(self):
+        '''All the configuration options'''
+        return json.loads(await self._client('config.get'))
+
+    async def get(self, option, default=None):
+        '''Get a particular option, or the default if it's missing'''
+        result = await self._client('config.get', option)
+        if not result:
+            return default
+        return json.loads(result)
+
+    async def set(self, option, value):
+        '''Set an option'''
+        return await self._client('config.set', option, value)
+
+    async def unset(self, option):
+        '''Remove an option'''
+        return await self._client('config.unset', option)
+
+    async def update(self, other=(), **kwargs):
+        '''Just like `dict.update`'''
+        _kwargs = dict(kwargs)
+        _kwargs.update(other)
+        for key, value in _kwargs.items():
+            await self.set(key, value)
+
+    async def clear(self):
+        '''Remove all keys'''
+        for key in (await self.all()).keys():
+            await self.unset(key)
+
+
+class Events(object):
+    '''An asynchronous iterator of ``(event, jid)`` qless events:
+
+        async for event, jid in client.events:
+            ...'''
+    namespace = _listener.Events.namespace
+    events = _listener.Events.events
+
+    def __init__(self, redis, events=None):
+        self._redis = redis
+        self._channels = [
+            self.namespace + event for event in (events or self.events)]
+
+    async def listen(self):
+        '''Listen for events as they come in'''
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(*self._channels)
+        try:
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    logger.debug('Message: %s', message)
+                    yield (
+                        message['channel'][len(self.namespace):],
+                        message['data'])
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.close()
+
+    def __aiter__(self):
+        return self.listen()
+
+
+class Client(object):
+    '''An asyncio qless client'''
+    def __init__(self, url='redis://localhost:6379', hostname=None,
+        codec='json', **kwargs):
+        if aioredis is None:  # pragma: no cover
+            raise QlessException('qless.aio requires redis.asyncio')
+        # This is our unique idenitifier as a worker
+        self.worker_name = hostname or socket.gethostname()
+        # How we encode job data. Any registered codec can decode it
+        self.codecs = Codecs(codec)
+        kwargs['decode_responses'] = True
+        self.redis = aioredis.Redis.from_url(url, **kwargs)
+        self.jobs = Jobs(self)
+        self.queues = Queues(self)
+        self.config = Config(self)
+
+        # We now have a single unified core script, read once per process
+        self._lua = self.redis.register_script(Script.source())
+
+    def __getattr__(self, key):
+        if key == 'events':
+            self.events = Events(self.redis)
+            return self.events
+        raise AttributeError('%s has no attribute %s' % (
+            self.__class__.__module__ + '.' + self.__class__.__name__, key))
+
+    def _args(self, command, *args):
+        '''The arguments to the qless-core script for this command'''
+        lua_args = [command, repr(time.time())]
+        lua_args.extend(args)
+        return lua_args
+
+    async def __call__(self, command, *args):
+        try:
+            return await self._lua(keys=[], args=self._args(command, *args))
+        except ResponseError as exc:
+            raise QlessException(str(exc))
+
+    async def pipelined(self, commands):
+        '''Send each of the commands, a tuple of the command and its
+        arguments, in a single round trip, returning their results. If any
+        of them fail, the first error is raised once they've all run'''
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for command in commands:
+                await self._lua(
+                    keys=[], args=self._args(*command), client=pipe)
+            results = await pipe.execute(raise_on_error=False)
+        for result in results:
+            if isinstance(result, ResponseError):
+                raise QlessException(str(result))
+        return results
+
+    async def close(self):
+        '''Close the connections to Redis'''
+        await self.redis.close()
@@ -0,0 +1,18 @@
+'''An asyncio qless client, built on the same qless-core script. This requires
+Python 3.5 and a version of redis-py that provides ``redis.asyncio``:
+
+    client = qless.aio.Client()
+    jid = await client.queues['foo'].put('gnomes.GnomesJob', {})
+    job = await client.queues['foo'].pop()
+    await job.complete()'''
+
+import sys
+
+# Coroutine functions can't be defined before Python 3.5, so they're kept in
+# a module that's only imported after this check
+if sys.version_info < (3, 5):  # pragma: no cover
+    raise ImportError('qless.aio requires Python 3.5 or later')
+
+from qless._aio import (
+    Jobs, Queues, Queue, Job, RecurringJob, Config, Events, Client)
+from qless.exceptions import QlessException, LostLockException
@@ -0,0 +1,125 @@
+'''Buffering qless commands into a single round trip'''
+
+import redis
+from redis.exceptions import NoScriptError
+
+# Internal imports
+from qless.exceptions import QlessException
+
+
+class Future(object):
+    '''A placeholder for the result of a batched command, which is resolved
+    when the batch it belongs to is flushed'''
+    def __init__(self, command, args):
+        self.command = command
+        self.args = args
+        self.resolved = False
+        self._value = None
+        self._exception = None
+
+    def __repr__(self):
+        return '<qless.Future %s%s>' % (
+            self.command, (self.resolved and ' (resolved)') or '')
+
+    def resolve(self, value):
+        '''Provide the result of the command'''
+        self.resolved = True
+        self._value = value
+
+    def reject(self, exception):
+        '''Provide the exception the command raised'''
+        self.resolved = True
+        self._exception = exception
+
+    @property
+    def exception(self):
+        '''The exception the command raised, if any'''
+        return self._exception
+
+    def result(self):
+        '''The result of the command, raising its exception if it failed'''
+        if not self.resolved:
+            raise QlessException('Result of %s requested before flushing' % (
+                self.command))
+        if self._exception is not None:
+            raise self._exception
+        return self._value
+
+
+class Batch(object):
+    '''Buffers qless-core invocations and sends them in a single pipeline.
+    A batch is called just like a client, but returns a ``Future`` for each
+    command instead of its result:
+
+        with client.batch() as batch:
+            first = batch('complete', jid, worker, queue, data)
+            second = batch('tag', 'add', jid, 'foo')
+        first.result()
+
+    Commands are not transactional: each one succeeds or fails on its own,
+    and a failure is raised only when that command's result is requested.'''
+    def __init__(self, client):
+        self.client = client
+        self._futures = []
+        self._messages = []
+
+    def __len__(self):
+        return len(self._futures)
+
+    def __call__(self, command, *args):
+        future = Future(command, args)
+        self._futures.append(future)
+        return future
+
+    def publish(self, channel, message):
+        '''Publish a message once the buffered commands have run, in the same
+        round trip'''
+        self._messages.append((channel, message))
+
+    def flush(self):
+        '''Send all the buffered commands, resolving their futures. Returns
+        the list of futures that were flushed'''
+        futures, self._futures = self._futures, []
+        messages, self._messages = self._messages, []
+        if not futures and not messages:
+            return futures
+        results = self._execute(futures, messages)
+        missing = [index for index, result in enumerate(results)
+            if isinstance(result, NoScriptError)]
+        if missing:
+            # The server's script cache was flushed since we loaded it, so
+            # none of these commands ran. Load it again and retry them, and
+            # publish the messages again now that they have
+            self.client._lua.load(force=True)
+            retried = self._execute(
+                [futures[index] for index in missing], messages)
+            for index, result in zip(missing, retried):
+                results[index] = result
+        for future, result in zip(futures, results):
+            if isinstance(result, redis.ResponseError):
+                future.reject(QlessException(str(result)))
+            else:
+                future.resolve(result)
+        return futures
+
+    def _execute(self, futures, messages=()):
+        '''Run the commands for these futures in a pipeline, followed by
+        publishing the messages, returning the commands' results'''
+        pipe = self.client.redis.pipeline(transaction=False)
+        for future in futures:
+            self.client._lua(
+                self.client._args(future.command, *future.args), client=pipe)
+        for channel, message in messages:
+            pipe.publish(channel, message)
+        return pipe.execute(raise_on_error=False)[:len(futures)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, value, trace):
+        # Only send the commands if the block completed successfully
+        if typ is None:
+            self.flush()
+        else:
+            self._futures = []
+            self._messages = []
@@ -0,0 +1,108 @@
+'''Operating on many jobs at once'''
+
+import itertools
+import simplejson as json
+
+# Internal imports
+from qless.exceptions import QlessException
+
+
+class Report(object):
+    '''The outcome of a bulk operation. `results` maps each jid for which the
+    command succeeded to its result, and `errors` maps each jid for which it
+    failed to the exception'''
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+
+    def __repr__(self):
+        return '<qless.bulk.Report %i succeeded, %i failed>' % (
+            len(self.results), len(self.errors))
+
+
+class Bulk(object):
+    '''Operations on many jobs, given by their jids:
+
+        report = client.jobs.bulk(jids).tag('remediated')
+        for jid, exc in report.errors.items():
+            ...
+
+    The commands for `chunk_size` jobs at a time are sent in a single round
+    trip. Each command succeeds or fails on its own, and each operation
+    returns a ``Report`` of them. If provided, `progress` is called after each
+    chunk with the number of jobs done so far, and the total number of jobs
+    (or ``None`` if the jids were given by an iterator).'''
+    def __init__(self, client, jids, chunk_size=500, progress=None):
+        self.client = client
+        self.jids = jids
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+    def cancel(self):
+        '''Cancel the jobs'''
+        return self._run(lambda jid, job: ('cancel', jid))
+
+    def tag(self, *tags):
+        '''Tag the jobs with additional tags'''
+        return self._run(lambda jid, job: ('tag', 'add', jid) + tags)
+
+    def untag(self, *tags):
+        '''Remove tags from the jobs'''
+        return self._run(lambda jid, job: ('tag', 'remove', jid) + tags)
+
+    def priority(self, priority):
+        '''Set the priority of the jobs'''
+        return self._run(lambda jid, job: ('priority', jid, priority))
+
+    def retry(self, delay=0):
+        '''Retry the jobs in a little bit, in the queues they're in. Just
+        like ``Job.retry``, this is meant for running jobs'''
+        return self._run(lambda jid, job: (
+            'retry', jid, job['queue'], job['worker'], delay), lookup=True)
+
+    def move(self, queue, delay=0, depends=None):
+        '''Move the jobs to another queue'''
+        depends = json.dumps(depends or [])
+        # The data is sent back just as we got it, without decoding it
+        return self._run(lambda jid, job: (
+            'put', queue, jid, job['klass'], job['data'], delay,
+            'depends', depends), lookup=True)
+
+    def _chunks(self):
+        '''The jids, `chunk_size` at a time'''
+        jids = iter(self.jids)
+        chunk = list(itertools.islice(jids, self.chunk_size))
+        while chunk:
+            yield chunk
+            chunk = list(itertools.islice(jids, self.chunk_size))
+
+    def _run(self, command, lookup=False):
+        '''Run the command returned by ``command(jid, job)`` for each jid.
+        If `lookup`, `job` is the job's information, fetched a chunk at a
+        time, and otherwise it's ``None``'''
+        report = Report()
+        total = len(self.jids) if hasattr(self.jids, '__len__') else None
+        done = 0
+        for chunk in self._chunks():
+            jobs = {}
+            if lookup:
+                jobs = dict((job['jid'], job) for job in
+                    json.loads(self.client('multiget', *chunk)) or [])
+            futures = []
+            with self.client.batch() as batch:
+                for jid in chunk:
+                    if lookup and jid not in jobs:
+                        report.errors[jid] = QlessException(
+                            'Job %s does not exist' % jid)
+                    else:
+                        futures.append(
+                            (jid, batch(*command(jid, jobs.get(jid)))))
+            for jid, future in futures:
+                if future.exception is not None:
+                    report.errors[jid] = future.exception
+                else:
+                    report.results[jid] = future.result()
+            done += len(chunk)
+            if self.progress:
+                self.progress(done, total)
+        return report
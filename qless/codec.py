@@ -0,0 +1,136 @@
+'''Encoding and decoding job data'''
+
+import base64
+import simplejson as json
+
+# Internal imports
+from qless.exceptions import QlessException
+
+# Optional faster / more compact serializers
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+class Codec(object):
+    '''Turns job data into a string and back. qless-core insists that job data
+    is JSON, so codecs that don't produce JSON are stored in an envelope that
+    names the codec that produced them'''
+    # The name the codec is registered and marked with
+    name = None
+    # Whether or not the encoded data is itself JSON
+    json = True
+
+    def dumps(self, data):
+        '''Encode job data as a string'''
+        raise NotImplementedError('Derived classes must override "dumps"')
+
+    def loads(self, raw):
+        '''Decode job data from a string'''
+        raise NotImplementedError('Derived classes must override "loads"')
+
+
+class JSONCodec(Codec):
+    '''The default, plain-old JSON'''
+    name = 'json'
+
+    def dumps(self, data):
+        return json.dumps(data)
+
+    def loads(self, raw):
+        return json.loads(raw)
+
+
+class OrjsonCodec(Codec):
+    '''JSON, but faster, by way of orjson'''
+    name = 'orjson'
+
+    def dumps(self, data):
+        return orjson.dumps(data).decode('utf-8')
+
+    def loads(self, raw):
+        return orjson.loads(raw)
+
+
+class MsgpackCodec(Codec):
+    '''Base64-encoded msgpack, which is more compact for large payloads'''
+    name = 'msgpack'
+    json = False
+
+    def dumps(self, data):
+        return base64.b64encode(
+            msgpack.packb(data, use_bin_type=True)).decode('ascii')
+
+    def loads(self, raw):
+        return msgpack.unpackb(base64.b64decode(raw), raw=False)
+
+
+class Codecs(object):
+    '''A registry of the available codecs, and the default one to encode job
+    data with. Data is decoded with whichever codec it was encoded with, so
+    producers and consumers may use different defaults'''
+    # The key in the envelope naming the codec for non-JSON data
+    marker = '__qless_codec__'
+
+    def __init__(self, default='json'):
+        self._codecs = {}
+        self.register(JSONCodec())
+        if orjson is not None:
+            self.register(OrjsonCodec())
+        if msgpack is not None:
+            self.register(MsgpackCodec())
+        self.default = default
+        # Check that the default is actually available
+        self[default]
+
+    def __getitem__(self, name):
+        try:
+            return self._codecs[name]
+        except KeyError:
+            raise QlessException('Unknown codec %s' % name)
+
+    def __contains__(self, name):
+        return name in self._codecs
+
+    def __iter__(self):
+        '''The names of the registered codecs'''
+        return iter(sorted(self._codecs))
+
+    def register(self, codec):
+        '''Make a codec available by its name'''
+        self._codecs[codec.name] = codec
+        # The fastest available JSON codec is used to read any payload
+        self._json = self._codecs.get('orjson') or self._codecs['json']
+
+    def enveloped(self, data):
+        '''Whether decoded JSON is exactly one of our envelopes'''
+        return (isinstance(data, dict) and len(data) == 2 and
+            self.marker in data and 'payload' in data)
+
+    def dumps(self, data, codec=None):
+        '''Encode data with the provided codec, or the default. Data that
+        would otherwise be mistaken for an envelope is put in one'''
+        codec = self[codec or self.default]
+        if codec.json and not self.enveloped(data):
+            return codec.dumps(data)
+        return self._json.dumps({
+            self.marker: codec.name, 'payload': codec.dumps(data)})
+
+    def loads(self, raw):
+        '''Decode data encoded with any registered codec'''
+        try:
+            data = self._json.loads(raw)
+        except ValueError:
+            # orjson rejects some of what json accepts, like NaN
+            if self._json is self._codecs['json']:
+                raise
+            data = self._codecs['json'].loads(raw)
+        if self.enveloped(data):
+            return self[data[self.marker]].loads(data['payload'])
+        return data
@@ -1,32 +1,96 @@
 '''All our configuration operations'''
 
+import os
+import time
+import redis
+import threading
 import simplejson as json
+from six import string_types
 
 
 class Config(object):
-    '''A class that allows us to change and manipulate qless config'''
-    def __init__(self, client):
+    '''A class that allows us to change and manipulate qless config.
+
+    If a `ttl` is provided, the whole config is cached for up to that many
+    seconds. Clients announce their changes on the `ql:config` channel, and a
+    cached config is dropped as soon as it sees such an announcement. Changes
+    made by other means are picked up when the cache expires.'''
+    # The channel on which changes to the config are announced
+    channel = 'ql:config'
+
+    def __init__(self, client, ttl=None):
         self._client = client
+        self._ttl = ttl
+        self._cache = None
+        self._cached_at = 0
+        self._pubsub = None
+        self._pid = None
+        # Guards the cache and the subscription, which threads share
+        self._lock = threading.Lock()
 
     def __getattr__(self, attr):
         if attr == 'all':
-            return json.loads(self._client('config.get'))
+            if not self._ttl:
+                return self._fetch()
+            with self._lock:
+                if self._stale():
+                    self._cache = self._fetch()
+                    self._cached_at = time.time()
+                return dict(self._cache)
         raise AttributeError('qless.Config has no attribute %s' % attr)
 
+    def _fetch(self):
+        '''Get all of the config from Redis'''
+        return json.loads(self._client('config.get'))
+
+    def _stale(self):
+        '''Whether the cached config may be out of date'''
+        if self._pubsub is None or self._pid != os.getpid():
+            # Subscribe before reading the config, so that we can't miss a
+            # change made in between. Forked children need their own
+            # connection rather than sharing their parent's
+            self._pid = os.getpid()
+            self._pubsub = self._client.redis.pubsub()
+            self._pubsub.subscribe(self.channel)
+            return True
+        stale = (self._cache is None or
+            time.time() - self._cached_at > self._ttl)
+        try:
+            message = self._pubsub.get_message()
+            while message:
+                if message['type'] == 'message':
+                    stale = True
+                message = self._pubsub.get_message()
+        except redis.ConnectionError:
+            # We may have missed changes while disconnected
+            self._pubsub = None
+            return True
+        return stale
+
+    def _drop(self):
+        '''Drop our cached config'''
+        with self._lock:
+            self._cache = None
+
     def __len__(self):
         return len(self.all)
 
     def __getitem__(self, option):
+        if self._ttl:
+            result = self.all.get(option)
+            if isinstance(result, string_types):
+                return json.loads(result)
+            return result
         result = self._client('config.get', option)
         if not result:
             return None
         return json.loads(result)
 
     def __setitem__(self, option, value):
-        return self._client('config.set', option, value)
+        return self._batch('config.set', [(option, value)])[0]
 
     def __delitem__(self, option):
-        return self._client('config.unset', option)
+        return self._batch('config.unset', [(option,)])[0]
 
     def __contains__(self, option):
         return dict.__contains__(self.all, option)
@@ -36,8 +100,7 @@ class Config(object):
 
     def clear(self):
         '''Remove all keys'''
-        for key in self.all.keys():
-            self._client('config.unset', key)
+        self._batch('config.unset', [(key,) for key in self._fetch()])
 
     def get(self, option, default=None):
         '''Get a particular option, or the default if it's missing'''
@@ -62,8 +125,19 @@ class Config(object):
         '''Just like `dict.update`'''
         _kwargs = dict(kwargs)
         _kwargs.update(other)
-        for key, value in _kwargs.items():
-            self[key] = value
+        self._batch('config.set', list(_kwargs.items()))
+
+    def _batch(self, command, args):
+        '''Run a config command for each of the args, and tell everyone else
+        to drop their cached config, in one round trip. Returns the results
+        of the commands'''
+        if not args:
+            return []
+        with self._client.batch() as batch:
+            futures = [batch(command, *arg) for arg in args]
+            batch.publish(self.channel, 'changed')
+        self._drop()
+        return [future.result() for future in futures]
 
     def values(self):
         '''Just like `dict.values`'''
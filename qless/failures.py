@@ -0,0 +1,112 @@
+'''Summarizing failed jobs'''
+
+import os
+import re
+import hashlib
+import simplejson as json
+from collections import Counter
+
+# Internal imports
+from qless.util import paginate
+
+
+class Summary(object):
+    '''Counts of failed jobs by group, exception class, job class, queue and
+    traceback signature. For each signature, `examples` holds the jid and the
+    last line of the message of the first failure seen with it.'''
+    def __init__(self):
+        self.total = 0
+        self.groups = Counter()
+        self.exceptions = Counter()
+        self.klasses = Counter()
+        self.queues = Counter()
+        self.signatures = Counter()
+        self.examples = {}
+
+    def __repr__(self):
+        return '<qless.failures.Summary %i failed in %i groups>' % (
+            self.total, len(self.groups))
+
+    def add(self, job):
+        '''Count a failed job, given as the dictionary qless-core returns'''
+        failure = job.get('failure') or {}
+        group = failure.get('group') or ''
+        message = failure.get('message') or ''
+        exception = exception_name(group, job.get('queue') or '', message)
+        sig = signature(exception, message)
+        self.total += 1
+        self.groups[group] += 1
+        self.exceptions[exception] += 1
+        self.klasses[job.get('klass')] += 1
+        self.queues[job.get('queue')] += 1
+        self.signatures[sig] += 1
+        if sig not in self.examples:
+            lines = message.strip().splitlines()
+            self.examples[sig] = (job['jid'], lines and lines[-1] or '')
+
+
+# The frames of a Python traceback
+FRAME = re.compile(r'^\s*File "([^"]+)", line \d+, in (\S+)', re.M)
+# The last line of a Python traceback, naming the exception
+EXCEPTION = re.compile(r'^([A-Za-z_][\w.]*)(:|$)')
+# Things that vary between failures from the same place
+VARIABLE = re.compile(r'0x[0-9a-fA-F]+|\d+')
+
+
+def exception_name(group, queue, message):
+    '''The exception class of a failure, from the last line of its traceback
+    or else from its group, which workers name `<queue>-<exception class>`'''
+    if message.startswith('Traceback'):
+        match = EXCEPTION.match(message.strip().splitlines()[-1])
+        if match:
+            return match.group(1)
+    if queue and group.startswith(queue + '-'):
+        return group[len(queue) + 1:]
+    return group
+
+
+def signature(exception, message):
+    '''A short hash that's the same for failures with the same exception
+    raised from the same place. Line numbers are ignored so that a failure
+    keeps its signature across deploys, and if there's no traceback, numbers
+    and addresses are ignored in the message instead'''
+    frames = FRAME.findall(message)
+    if frames:
+        text = '|'.join([exception] + [
+            '%s:%s' % (os.path.basename(path), func) for path, func in frames])
+    else:
+        text = exception + '|' + VARIABLE.sub('N', message)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:12]
+
+
+class FailureScanner(object):
+    '''Walks through every failed job in the provided groups (or in all of
+    them), summarizing them as it goes without holding on to them:
+
+        summary = qless.FailureScanner(client).scan()
+        summary.signatures.most_common(10)
+
+    Jobs are fetched `count` at a time with a single multiget, with the next
+    page read ahead while the current one is counted. Their data is never
+    decoded.'''
+    def __init__(self, client, groups=None, count=500):
+        self.client = client
+        self.groups = groups
+        self.count = count
+
+    def jobs(self, group):
+        '''Iterate over the failed jobs in a group, as dictionaries'''
+        return paginate(
+            lambda start, limit: json.loads(
+                self.client.read('failed', group, start, limit))['jobs'],
+            self.count,
+            lambda jids: json.loads(self.client('multiget', *jids)) or [])
+
+    def scan(self, summary=None):
+        '''Summarize the failed jobs, adding them to `summary` if provided'''
+        summary = summary or Summary()
+        groups = self.groups or list(self.client.jobs.failed() or {})
+        for group in groups:
+            for job in self.jobs(group):
+                summary.add(job)
+        return summary
@@ -5,6 +5,7 @@
 import os
 import time
 import types
+import inspect
 import traceback
 import simplejson as json
 from six.moves import reload_module
@@ -13,6 +14,10 @@ from six.moves import reload_module
 from qless import logger
 from qless.exceptions import LostLockException, QlessException
 
+# Coroutine functions can't be defined before Python 3.5
+iscoroutinefunction = getattr(
+    inspect, 'iscoroutinefunction', lambda func: False)
+
 
 class BaseJob(object):
     '''This is a dictionary of all the classes that we've seen, and
@@ -20,6 +25,12 @@ class BaseJob(object):
     the debug mode or the general mechanism'''
     _loaded = {}
 
+    # Jobs are often held in large numbers, so every known attribute has a
+    # slot. Arbitrary attributes may still be set, in a lazily-made __dict__
+    __slots__ = ('client', 'jid', 'priority', 'klass_name', 'queue_name',
+        'tags', 'data', 'queue', 'klass', '_raw_data', '__dict__',
+        '__weakref__')
+
     def __init__(self, client, **kwargs):
         self.client = client
         for att in ['jid', 'priority']:
@@ -28,7 +39,10 @@ class BaseJob(object):
         object.__setattr__(self, 'queue_name', kwargs['queue'])
         # Because of how Lua parses JSON, empty tags comes through as {}
         object.__setattr__(self, 'tags', kwargs['tags'] or [])
-        object.__setattr__(self, 'data', json.loads(kwargs['data']))
+        # The user data is only decoded when it's first accessed, since
+        # listing jobs rarely needs more than their jid or state. Until then,
+        # only the encoded data is kept, rather than the whole record
+        object.__setattr__(self, '_raw_data', kwargs['data'])
 
     def __setattr__(self, key, value):
         if key == 'priority':
@@ -47,9 +61,26 @@ class BaseJob(object):
             # Get a reference to the provided klass
             object.__setattr__(self, 'klass', self._import(self.klass_name))
             return self.klass
+        elif key == 'data':
+            # Decode the user data, and only then drop the encoded copy, so
+            # that it's still there to send back if it can't be decoded
+            data = self.client.codecs.loads(self._raw_data)
+            object.__setattr__(self, 'data', data)
+            object.__setattr__(self, '_raw_data', None)
+            return data
         raise AttributeError('%s has no attribute %s' % (
             self.__class__.__module__ + '.' + self.__class__.__name__, key))
 
+    def _encoded_data(self):
+        '''The encoded user data, reusing the original if it was never
+        decoded'''
+        try:
+            # Read the slot directly, so as not to decode the data
+            data = BaseJob.data.__get__(self)
+        except AttributeError:
+            return self._raw_data
+        return self.client.codecs.dumps(data)
+
     @staticmethod
     def reload(klass):
         '''Force a reload of this klass on next import'''
@@ -84,6 +115,7 @@ class BaseJob(object):
         '''Cancel a job. It will be deleted from the system, the thinking
         being that if you don't want to do any work on it, it shouldn't be in
         the queueing system.'''
+        object.__setattr__(self, 'state_changed', True)
         return self.client('cancel', self.jid)
 
     def tag(self, *tags):
@@ -97,11 +129,14 @@ class BaseJob(object):
 
 class Job(BaseJob):
     '''The Job class'''
+    __slots__ = ('state', 'tracked', 'failure', 'history', 'dependents',
+        'dependencies', 'expires_at', 'original_retries', 'retries_left',
+        'worker_name', 'sandbox', 'state_changed')
+
     def __init__(self, client, **kwargs):
         BaseJob.__init__(self, client, **kwargs)
         self.client = client
-        for att in ['state', 'tracked', 'failure',
-            'history', 'dependents', 'dependencies']:
+        for att in ['state', 'tracked', 'failure', 'history']:
             object.__setattr__(self, att, kwargs[att])
 
         # The reason we're using object.__setattr__ directly is because
@@ -114,6 +149,9 @@ class Job(BaseJob):
         # Because of how Lua parses JSON, empty lists come through as {}
         object.__setattr__(self, 'dependents', kwargs['dependents'] or [])
         object.__setattr__(self, 'dependencies', kwargs['dependencies'] or [])
+        # Whether we've completed, failed, retried, moved or canceled it, so
+        # that we expect heartbeats to fail from then on
+        object.__setattr__(self, 'state_changed', False)
 
     def __getattr__(self, key):
         if key == 'ttl':
@@ -130,46 +168,66 @@ class Job(BaseJob):
     def __repr__(self):
         return '<%s %s>' % (self.klass_name, self.jid)
 
-    def process(self):
-        '''Load the module containing your class, and run the appropriate
-        method. For example, if this job was popped from the queue
-        ``testing``, then this would invoke the ``testing`` staticmethod of
-        your class.'''
+    def _method(self, coroutine=False):
+        '''The method of our class to run for this job: the staticmethod
+        named for our queue, or else ``process``. It must be a coroutine
+        function if `coroutine`, and a plain function otherwise. If there's no
+        suitable method, the job is failed and this returns ``None``.'''
         try:
             method = getattr(self.klass, self.queue_name,
                 getattr(self.klass, 'process', None))
         except Exception as exc:
             # We failed to import the module containing this class
             logger.exception('Failed to import %s', self.klass_name)
-            return self.fail(self.queue_name + '-' + exc.__class__.__name__,
+            self.fail(self.queue_name + '-' + exc.__class__.__name__,
                 'Failed to import %s' % self.klass_name)
+            return None
 
-        if method:
-            if isinstance(method, types.FunctionType):
-                try:
-                    logger.info('Processing %s in %s',
-                        self.jid, self.queue_name)
-                    method(self)
-                    logger.info('Completed %s in %s',
-                        self.jid, self.queue_name)
-                except Exception as exc:
-                    # Make error type based on exception type
-                    logger.exception('Failed %s in %s: %s',
-                        self.jid, self.queue_name, repr(method))
-                    self.fail(self.queue_name + '-' + exc.__class__.__name__,
-                        traceback.format_exc())
-            else:
-                # Or fail with a message to that effect
-                logger.error('Failed %s in %s : %s is not static',
-                    self.jid, self.queue_name, repr(method))
-                self.fail(self.queue_name + '-method-type',
-                    repr(method) + ' is not static')
-        else:
-            # Or fail with a message to that effect
+        if not method:
+            # Fail with a message to that effect
             logger.error('Failed %s : %s is missing a method "%s" or "process"',
                          self.jid, self.klass_name, self.queue_name)
             self.fail(self.queue_name + '-method-missing', self.klass_name +
                 ' is missing a method "' + self.queue_name + '" or "process"')
+            return None
+
+        if not isinstance(method, types.FunctionType):
+            # Or fail with a message to that effect
+            logger.error('Failed %s in %s : %s is not static',
+                self.jid, self.queue_name, repr(method))
+            self.fail(self.queue_name + '-method-type',
+                repr(method) + ' is not static')
+            return None
+
+        if iscoroutinefunction(method) != coroutine:
+            # This worker can't run this kind of method
+            message = '%r is %sa coroutine function' % (
+                method, (coroutine and 'not ') or '')
+            logger.error('Failed %s in %s : %s', self.jid, self.queue_name,
+                message)
+            self.fail(self.queue_name + '-method-type', message)
+            return None
+        return method
+
+    def process(self):
+        '''Load the module containing your class, and run the appropriate
+        method. For example, if this job was popped from the queue
+        ``testing``, then this would invoke the ``testing`` staticmethod of
+        your class.'''
+        method = self._method()
+        if method:
+            try:
+                logger.info('Processing %s in %s',
+                    self.jid, self.queue_name)
+                method(self)
+                logger.info('Completed %s in %s',
+                    self.jid, self.queue_name)
+            except Exception as exc:
+                # Make error type based on exception type
+                logger.exception('Failed %s in %s: %s',
+                    self.jid, self.queue_name, repr(method))
+                self.fail(self.queue_name + '-' + exc.__class__.__name__,
+                    traceback.format_exc())
 
     def move(self, queue, delay=0, depends=None):
         '''Move this job out of its existing state and into another queue. If
@@ -178,25 +236,67 @@ class Job(BaseJob):
         delay, and dependencies'''
         logger.info('Moving %s to %s from %s',
             self.jid, queue, self.queue_name)
+        self.state_changed = True
+        target = self._shard(queue)
+        if target is not self.client:
+            return self._reshard(target, queue, delay, depends,
+                lambda: self.client('cancel', self.jid))
         return self.client('put', queue, self.jid, self.klass_name,
-            json.dumps(self.data), delay, 'depends', json.dumps(depends or [])
+            self._encoded_data(), delay,
+            'depends', json.dumps(depends or [])
         )
 
     def complete(self, nextq=None, delay=None, depends=None):
         '''Turn this job in as complete, optionally advancing it to another
         queue. Like ``Queue.put`` and ``move``, it accepts a delay, and
         dependencies'''
+        self.state_changed = True
         if nextq:
             logger.info('Advancing %s to %s from %s',
                 self.jid, nextq, self.queue_name)
+            target = self._shard(nextq)
+            if target is not self.client:
+                return self._reshard(target, nextq, delay, depends,
+                    lambda: self.client('complete', self.jid,
+                        self.client.worker_name, self.queue_name,
+                        self._encoded_data()) or False)
             return self.client('complete', self.jid, self.client.worker_name,
-                self.queue_name, json.dumps(self.data), 'next', nextq,
-                'delay', delay or 0, 'depends', json.dumps(depends or [])
+                self.queue_name, self._encoded_data(),
+                'next', nextq, 'delay', delay or 0,
+                'depends', json.dumps(depends or [])
             ) or False
         else:
             logger.info('Completing %s', self.jid)
             return self.client('complete', self.jid, self.client.worker_name,
-                self.queue_name, json.dumps(self.data)) or False
+                self.queue_name, self._encoded_data()
+            ) or False
+
+    def _shard(self, queue):
+        '''The client for the instance that a queue lives on. With a sharded
+        client, that may not be the one that this job is on'''
+        sharded = getattr(self.client, 'sharded', None)
+        if sharded is None:
+            return self.client
+        return sharded.shard(queue)
+
+    def _reshard(self, target, queue, delay, depends, leave):
+        '''Put this job in a queue on another instance, and then take it off
+        this one with `leave`, returning what that returns. It's put there
+        first so that it's never nowhere, and taken back off if it can't
+        leave here'''
+        target('put', queue, self.jid, self.klass_name, self._encoded_data(),
+            delay or 0,
+            'priority', self.priority,
+            'tags', json.dumps(self.tags),
+            'retries', self.original_retries,
+            'depends', json.dumps(depends or []))
+        try:
+            result = leave()
+        except QlessException:
+            target('cancel', self.jid)
+            raise
+        self.client = target
+        return result
 
     def heartbeat(self):
         '''Renew the heartbeat, if possible, and optionally update the job's
@@ -204,7 +304,8 @@ class Job(BaseJob):
         logger.debug('Heartbeating %s (ttl = %s)', self.jid, self.ttl)
         try:
             self.expires_at = float(self.client('heartbeat', self.jid,
-            self.client.worker_name, json.dumps(self.data)) or 0)
+            self.client.worker_name, self._encoded_data()
+            ) or 0)
         except QlessException:
             raise LostLockException(self.jid)
         logger.debug('Heartbeated %s (ttl = %s)', self.jid, self.ttl)
@@ -229,8 +330,9 @@ class Job(BaseJob):
         completed. __Returns__ the id of the failed job if successful, or
         `False` on failure.'''
         logger.warn('Failing %s (%s): %s', self.jid, group, message)
+        self.state_changed = True
         return self.client('fail', self.jid, self.client.worker_name, group,
-            message, json.dumps(self.data)) or False
+            message, self._encoded_data()) or False
 
     def track(self):
         '''Begin tracking this job'''
@@ -243,6 +345,7 @@ class Job(BaseJob):
     def retry(self, delay=0):
         '''Retry this job in a little bit, in the same queue. This is meant
         for the times when you detect a transient failure yourself'''
+        self.state_changed = True
         return self.client('retry', self.jid, self.queue_name,
             self.worker_name, delay)
 
@@ -268,6 +371,8 @@ class Job(BaseJob):
 
 class RecurringJob(BaseJob):
     '''Recurring Job object'''
+    __slots__ = ('retries', 'interval', 'count')
+
     def __init__(self, client, **kwargs):
         BaseJob.__init__(self, client, **kwargs)
         for att in ['jid', 'priority', 'tags',
@@ -277,14 +382,14 @@ class RecurringJob(BaseJob):
         object.__setattr__(self, 'klass_name', kwargs['klass'])
         object.__setattr__(self, 'queue_name', kwargs['queue'])
         object.__setattr__(self, 'tags', self.tags or [])
-        object.__setattr__(self, 'data', json.loads(kwargs['data']))
 
     def __setattr__(self, key, value):
         if key in ('priority', 'retries', 'interval'):
             return self.client('recur.update', self.jid, key, value
                 ) and object.__setattr__(self, key, value)
         if key == 'data':
-            return self.client('recur.update', self.jid, key, json.dumps(value)
+            return self.client('recur.update', self.jid, key,
+                self.client.codecs.dumps(value)
                 ) and object.__setattr__(self, 'data', value)
         if key == 'klass':
             name = value.__module__ + '.' + value.__name__
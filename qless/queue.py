@@ -5,8 +5,11 @@
 import time
 import uuid
 from six import string_types
+from six.moves import zip_longest
 
+from qless import util
 from qless.job import Job
+from qless.exceptions import QlessException
 import simplejson as json
 
 
@@ -36,6 +39,34 @@ class Jobs(object):
         '''Return all the recurring jobs'''
         return self.client('jobs', 'recurring', self.name, offset, count)
 
+    def iter_running(self, count=100, hydrate=False):
+        '''Iterate over all the currently-running jobs'''
+        return self._iter(self.running, count, hydrate)
+
+    def iter_stalled(self, count=100, hydrate=False):
+        '''Iterate over all the currently-stalled jobs'''
+        return self._iter(self.stalled, count, hydrate)
+
+    def iter_scheduled(self, count=100, hydrate=False):
+        '''Iterate over all the currently-scheduled jobs'''
+        return self._iter(self.scheduled, count, hydrate)
+
+    def iter_depends(self, count=100, hydrate=False):
+        '''Iterate over all the currently dependent jobs'''
+        return self._iter(self.depends, count, hydrate)
+
+    def iter_recurring(self, count=100, hydrate=False):
+        '''Iterate over all the recurring jobs'''
+        return self._iter(self.recurring, count,
+            hydrate and (lambda jids: self.client.jobs.lookup(*jids)))
+
+    def _iter(self, fetch, count, hydrate):
+        '''Iterate over the jids of a paginated listing, or over the jobs
+        themselves if `hydrate`, fetching `count` at a time'''
+        if hydrate is True:
+            hydrate = lambda jids: self.client.jobs.get(*jids)
+        return util.paginate(fetch, count, hydrate)
+
 
 class Queue(object):
     '''The Queue class'''
@@ -75,6 +106,20 @@ class Queue(object):
     def unpause(self):
         return self.client('unpause', self.name)
 
+    def _put_args(self, klass, data, priority=None, tags=None, delay=None,
+        retries=None, jid=None, depends=None):
+        '''The arguments to the `put` command for a job'''
+        return ('put', self.name,
+            jid or uuid.uuid4().hex,
+            self.class_string(klass),
+            self.client.codecs.dumps(data),
+            delay or 0,
+            'priority', priority or 0,
+            'tags', json.dumps(tags or []),
+            'retries', retries or 5,
+            'depends', json.dumps(depends or [])
+        )
+
     def put(self, klass, data, priority=None, tags=None, delay=None,
         retries=None, jid=None, depends=None):
         '''Either create a new job in the provided queue with the provided
@@ -87,16 +132,50 @@ class Queue(object):
         should be a JSON array of the tags associated with the instance and
         the `valid after` argument should be in how many seconds the instance
         should be considered actionable.'''
-        return self.client('put', self.name,
-            jid or uuid.uuid4().hex,
-            self.class_string(klass),
-            json.dumps(data),
-            delay or 0,
-            'priority', priority or 0,
-            'tags', json.dumps(tags or []),
-            'retries', retries or 5,
-            'depends', json.dumps(depends or [])
-        )
+        return self.client(*self._put_args(klass, data, priority, tags, delay,
+            retries, jid, depends))
+
+    def put_many(self, klass, jobs, chunk_size=500, **kwargs):
+        '''Put many jobs of the same class, sending them in pipelined chunks
+        of `chunk_size` jobs. Each item of `jobs` is either the data for a
+        job, or a tuple of `(data, options)` where `options` is a dictionary
+        overriding any of the keyword arguments of `put` for that job:
+
+            queue.put_many(MyJob, [{'id': 1}, ({'id': 2}, {'priority': 10})])
+
+        Any keyword arguments are used as the defaults for every job. The
+        input is consumed lazily, and this returns a generator of the jids,
+        yielded as each chunk is sent. Nothing is put until it's iterated.
+
+        If some of a chunk's jobs can't be put, the jids of the rest of that
+        chunk are still yielded, and then the first error is raised. No more
+        chunks are sent after that.'''
+        chunk = []
+        for job in jobs:
+            options = kwargs
+            if isinstance(job, tuple):
+                job, overrides = job
+                options = dict(kwargs)
+                options.update(overrides)
+            chunk.append(self._put_args(klass, job, **options))
+            if len(chunk) >= chunk_size:
+                for jid in self._put_chunk(chunk):
+                    yield jid
+                chunk = []
+        for jid in self._put_chunk(chunk):
+            yield jid
+
+    def _put_chunk(self, chunk):
+        '''Send a chunk of `put` commands in a single batch, yielding the jid
+        of each job that was put, and then raising the first error, if any'''
+        with self.client.batch() as batch:
+            futures = [batch(*args) for args in chunk]
+        for future in futures:
+            if future.exception is None:
+                yield future.result()
+        errors = [future.exception for future in futures if future.exception]
+        if errors:
+            raise errors[0]
 
     def recur(self, klass, data, interval, offset=0, priority=None, tags=None,
         retries=None, jid=None):
@@ -104,7 +183,7 @@ class Queue(object):
         return self.client('recur', self.name,
             jid or uuid.uuid4().hex,
             self.class_string(klass),
-            json.dumps(data),
+            self.client.codecs.dumps(data),
             'interval', interval, offset,
             'priority', priority or 0,
             'tags', json.dumps(tags or []),
@@ -149,7 +228,75 @@ class Queue(object):
         days, and then at the day resolution from there on out. The
         `histogram` key is a list of those values.'''
         return json.loads(
-            self.client('stats', self.name, date or repr(time.time())))
+            self.client.read('stats', self.name, date or repr(time.time())))
 
     def __len__(self):
         return self.client('length', self.name)
+
+
+def pop_many(queues, count, strategy='priority', weights=None, turn=0):
+    '''Pop up to `count` jobs from several queues. With the `priority`
+    strategy, queues are drained in the order given. With `round-robin`, jobs
+    are taken from each queue in turn, up to its weight at a time (given by
+    name in `weights`, and 1 by default), starting with the queue at index
+    `turn`.
+
+    The jobs to take from each queue are planned from its counts, in one
+    round trip to each Redis instance involved, and then popped in another.
+    The counts are only a hint, since jobs can come and go in between, and
+    some of those counted (like scheduled jobs) may not be ready. When a
+    queue comes up short, the rest are asked for the difference.'''
+    if strategy not in ('priority', 'round-robin'):
+        raise QlessException('Unknown pop strategy %s' % strategy)
+    # How many jobs each queue may have for us
+    futures = _batched(
+        [(queue, ('queues', queue.name)) for queue in queues])
+    available = []
+    for future in futures:
+        counts = json.loads(future.result())
+        available.append(0 if counts.get('paused') else sum(
+            counts.get(key, 0)
+            for key in ('waiting', 'stalled', 'scheduled', 'recurring')))
+
+    if strategy == 'round-robin':
+        weights = [(weights or {}).get(queue.name, 1) for queue in queues]
+    else:
+        weights = None
+    popped = [[] for _ in queues]
+    while count > 0:
+        allocation = util.allocate(available, count, weights, turn)
+        planned = [(index, number)
+            for index, number in enumerate(allocation) if number]
+        if not planned:
+            break
+        futures = _batched([(queues[index],
+            ('pop', queues[index].name, queues[index].worker_name, number))
+            for index, number in planned])
+        for (index, number), future in zip(planned, futures):
+            queue = queues[index]
+            jobs = [Job(queue.client, **job)
+                for job in json.loads(future.result())]
+            popped[index].extend(jobs)
+            count -= len(jobs)
+            # A queue that came up short has nothing more for us
+            available[index] = (
+                available[index] - len(jobs) if len(jobs) == number else 0)
+    if strategy == 'round-robin':
+        # Interleave the jobs from each queue
+        return [job for jobs in zip_longest(*popped) for job in jobs if job]
+    return [job for jobs in popped for job in jobs]
+
+
+def _batched(commands):
+    '''Send each (queue, command) pair with the queue's client, in one batch
+    for each client, returning the futures in the same order'''
+    batches = {}
+    futures = []
+    for queue, command in commands:
+        batch = batches.get(id(queue.client))
+        if batch is None:
+            batch = batches[id(queue.client)] = queue.client.batch()
+        futures.append(batch(*command))
+    for batch in batches.values():
+        batch.flush()
+    return futures
@@ -0,0 +1,60 @@
+'''Loading the qless-core script once per process and once per server'''
+
+import hashlib
+import pkgutil
+import threading
+
+from redis.exceptions import NoScriptError
+
+
+class Script(object):
+    '''The unified qless-core script. Its source and SHA are read once per
+    process, and it's loaded into each Redis server at most once, just before
+    the first command is sent there'''
+    _source = None
+    _sha = None
+    _lock = threading.Lock()
+    # The servers we know already have the script
+    _servers = set()
+
+    @classmethod
+    def source(cls):
+        '''The source of the script'''
+        if cls._source is None:
+            with cls._lock:
+                if cls._source is None:
+                    source = pkgutil.get_data('qless', 'qless-core/qless.lua')
+                    cls._sha = hashlib.sha1(source).hexdigest()
+                    cls._source = source
+        return cls._source
+
+    @classmethod
+    def sha(cls):
+        '''The SHA of the script'''
+        cls.source()
+        return cls._sha
+
+    def __init__(self, redis):
+        self.redis = redis
+        kwargs = redis.connection_pool.connection_kwargs
+        self.server = (
+            kwargs.get('host'), kwargs.get('port'), kwargs.get('path'))
+
+    def load(self, force=False):
+        '''Ensure that the script is loaded on our server'''
+        if force or self.server not in Script._servers:
+            if force or not self.redis.script_exists(self.sha())[0]:
+                self.redis.script_load(self.source())
+            Script._servers.add(self.server)
+
+    def __call__(self, args, client=None):
+        '''Run the script with the provided arguments. If a client is provided
+        (like a pipeline), the script is run with that instead'''
+        client = client or self.redis
+        self.load()
+        try:
+            return client.evalsha(self.sha(), 0, *args)
+        except NoScriptError:
+            # The server's script cache was flushed since we loaded it
+            self.load(force=True)
+            return client.evalsha(self.sha(), 0, *args)
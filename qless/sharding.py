@@ -0,0 +1,210 @@
+'''Spreading queues across several Redis instances'''
+
+import bisect
+import hashlib
+from six import string_types
+
+# Internal imports
+from qless import Client
+from qless.queue import pop_many
+
+
+class Ring(object):
+    '''A consistent hash ring, mapping keys to nodes so that adding or removing
+    a node only moves the keys in its neighborhood'''
+    def __init__(self, nodes, replicas=100):
+        self.replicas = replicas
+        self._hashes = []
+        self._nodes = []
+        for name, node in nodes:
+            self.add(name, node)
+
+    @staticmethod
+    def hash(key):
+        '''The position of a key on the ring'''
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def add(self, name, node):
+        '''Add a node, identified by a name, to the ring'''
+        for replica in range(self.replicas):
+            position = self.hash('%s-%i' % (name, replica))
+            index = bisect.bisect(self._hashes, position)
+            self._hashes.insert(index, position)
+            self._nodes.insert(index, node)
+
+    def __getitem__(self, key):
+        '''The node responsible for a key'''
+        index = bisect.bisect(self._hashes, self.hash(key))
+        return self._nodes[index % len(self._nodes)]
+
+
+class Jobs(object):
+    '''Class for accessing jobs across all the shards'''
+    def __init__(self, client):
+        self.client = client
+
+    def tracked(self):
+        '''Return an array of job objects that are being tracked'''
+        results = {'jobs': [], 'expired': []}
+        for client in self.client.clients:
+            tracked = client.jobs.tracked()
+            results['jobs'].extend(tracked['jobs'])
+            results['expired'].extend(tracked['expired'] or [])
+        return results
+
+    def failed(self):
+        '''The counts of the various types of failures across all shards. To
+        page through the jobs of a particular group, use each shard's client'''
+        results = {}
+        for client in self.client.clients:
+            for group, count in (client.jobs.failed() or {}).items():
+                results[group] = results.get(group, 0) + count
+        return results
+
+    def get(self, *jids):
+        '''Return jobs objects for all the jids, from whichever shards have
+        them'''
+        found = {}
+        for client in self.client.clients:
+            for job in client.jobs.get(*jids):
+                found[job.jid] = job
+        return [found[jid] for jid in jids if jid in found]
+
+    def lookup(self, *jids):
+        '''Return a job or recurring job object for each of the jids, or
+        ``None`` for those that don't exist on any shard. Every shard is
+        asked about every jid, in one round trip to each'''
+        lookups = []
+        for client in self.client.clients:
+            batch = client.batch()
+            lookups.append(
+                (client.jobs, batch, client.jobs._lookup(batch, jids)))
+        for _, batch, _ in lookups:
+            batch.flush()
+        results = [None] * len(jids)
+        for jobs, _, futures in lookups:
+            for index, pair in enumerate(futures):
+                found = jobs._resolve(*pair)
+                # A job advanced to another shard leaves a complete copy
+                # behind, which the live one takes precedence over
+                if found is not None and (results[index] is None or
+                    getattr(results[index], 'state', None) == 'complete'):
+                    results[index] = found
+        return results
+
+    def __getitem__(self, jid):
+        '''Get a job object corresponding to that jid, or ``None`` if it
+        doesn't exist on any shard'''
+        return self.lookup(jid)[0]
+
+
+class Workers(object):
+    '''Class for accessing worker information across all the shards'''
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, attr):
+        '''What workers are workers, and how many jobs are they running'''
+        if attr == 'counts':
+            counts = {}
+            for client in self.client.clients:
+                for worker in client.workers.counts or []:
+                    total = counts.setdefault(
+                        worker['name'],
+                        {'name': worker['name'], 'jobs': 0, 'stalled': 0})
+                    total['jobs'] += worker['jobs']
+                    total['stalled'] += worker['stalled']
+            return list(counts.values())
+        raise AttributeError('qless.Workers has no attribute %s' % attr)
+
+    def __getitem__(self, worker_name):
+        '''Which jobs does a particular worker have running'''
+        result = {'jobs': [], 'stalled': []}
+        for client in self.client.clients:
+            worker = client.workers[worker_name]
+            result['jobs'].extend(worker['jobs'])
+            result['stalled'].extend(worker['stalled'])
+        return result
+
+
+class Queues(object):
+    '''Class for accessing queues on the shards they belong to'''
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, attr):
+        '''What queues are there, and how many jobs do they have running,
+        waiting, scheduled, etc.'''
+        if attr == 'counts':
+            counts = []
+            for client in self.client.clients:
+                counts.extend(client.queues.counts or [])
+            return counts
+        raise AttributeError('qless.Queues has no attribute %s' % attr)
+
+    def __getitem__(self, queue_name):
+        '''Get a queue object associated with the provided queue name'''
+        return self.client.shard(queue_name).queues[queue_name]
+
+
+class ShardedClient(object):
+    '''A client that spreads queues across several Redis instances, each
+    running qless-core. Each queue is assigned to a shard by consistent
+    hashing of its name, and its jobs live on the same shard. It provides the
+    same `queues`, `jobs` and `workers` as a ``Client``, and can be given to
+    workers in place of one. Jobs moved or advanced to a queue on another
+    shard are put there, and taken off the shard they were on.
+
+    Shards may be provided as Redis URLs or as clients'''
+    def __init__(self, shards, hostname=None, replicas=100, **kwargs):
+        self.clients = []
+        nodes = []
+        for shard in shards:
+            if isinstance(shard, string_types):
+                client = Client(shard, hostname, **kwargs)
+                name = shard
+            else:
+                client = shard
+                conn = client.redis.connection_pool.connection_kwargs
+                name = '%s:%s/%s' % (
+                    conn.get('host') or conn.get('path'),
+                    conn.get('port'), conn.get('db', 0))
+            client.sharded = self
+            self.clients.append(client)
+            nodes.append((name, client))
+        self._ring = Ring(nodes, replicas)
+        # Which queue round-robin pops start from next
+        self._turn = -1
+        self.jobs = Jobs(self)
+        self.queues = Queues(self)
+        self.workers = Workers(self)
+
+    @property
+    def worker_name(self):
+        '''Our unique identifier as a worker, on all the shards'''
+        return self.clients[0].worker_name
+
+    @worker_name.setter
+    def worker_name(self, value):
+        for client in self.clients:
+            client.worker_name = value
+
+    def shard(self, queue_name):
+        '''The client for the shard on which a queue lives'''
+        return self._ring[queue_name]
+
+    def pop_many(self, queues, count=1, strategy='priority', weights=None):
+        '''Pop up to `count` jobs from the named queues, wherever they are,
+        in as few as one round trip to each shard'''
+        self._turn += 1
+        return pop_many([self.queues[queue] if isinstance(queue, string_types)
+            else queue for queue in queues],
+            count, strategy, weights, self._turn)
+
+    def track(self, jid):
+        '''Begin tracking this job'''
+        return self.jobs[jid].track()
+
+    def untrack(self, jid):
+        '''Stop tracking this job'''
+        return self.jobs[jid].untrack()
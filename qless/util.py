@@ -1,5 +1,14 @@
 '''Some utility functions'''
 
+import sys
+import threading
+
+# Not available on Windows
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
 
 def import_class(klass):
     '''Import the named class and return that class'''
@@ -7,3 +16,100 @@ def import_class(klass):
     for segment in klass.split('.')[1:-1]:
         mod = getattr(mod, segment)
     return getattr(mod, klass.rpartition('.')[2])
+
+
+def rss():
+    '''The resident memory of this process in bytes, or the most it's had if
+    that's all we can tell, or ``None`` if we can't tell at all'''
+    if resource is None:  # pragma: no cover
+        return None
+    try:
+        with open('/proc/self/statm') as fin:
+            return int(fin.read().split()[1]) * resource.getpagesize()
+    except (IOError, OSError):
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # This is in bytes on OS X, and kilobytes elsewhere
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+
+class Prefetch(threading.Thread):
+    '''Calls a function in a background thread, holding on to its result'''
+    def __init__(self, func, *args):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._func = func
+        self._args = args
+        self._result = None
+        self._exception = None
+        self.start()
+
+    def run(self):
+        try:
+            self._result = self._func(*self._args)
+        except Exception as exc:
+            self._exception = exc
+
+    def result(self):
+        '''Wait for the result, raising the function's exception if it
+        failed'''
+        self.join()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+def paginate(fetch, count=100, hydrate=None):
+    '''Iterate over every item of a paginated listing, where
+    ``fetch(offset, count)`` returns a page of it. Each page is fetched in the
+    background while the one before it is consumed. If provided, ``hydrate``
+    is called on each page there too, to turn jids into jobs, for example.
+
+    Listings can change while they're paged through, so items may be missed
+    or seen twice.'''
+    def page(offset):
+        items = fetch(offset, count) or []
+        if hydrate and items:
+            return items, hydrate(items)
+        return items, items
+
+    pending = Prefetch(page, 0)
+    offset = 0
+    while pending is not None:
+        items, results = pending.result()
+        if len(items) < count:
+            pending = None
+        else:
+            offset += count
+            pending = Prefetch(page, offset)
+        for result in results:
+            yield result
+
+
+def allocate(available, count, weights=None, turn=0):
+    '''Divide up to ``count`` items among sources, given how many each has
+    available. Without weights, sources are drained in order. With weights,
+    each source in turn is given up to its weight, starting with the source
+    at index ``turn``, until ``count`` is reached or every source is drained.
+    Returns how many to take from each source.'''
+    allocation = [0] * len(available)
+    if weights is None:
+        for index, avail in enumerate(available):
+            allocation[index] = max(min(avail, count), 0)
+            count -= allocation[index]
+        return allocation
+    order = list(range(len(available)))
+    if order:
+        turn %= len(order)
+        order = order[turn:] + order[:turn]
+    while count > 0:
+        progressed = False
+        for index in order:
+            take = min(
+                weights[index], available[index] - allocation[index], count)
+            if take > 0:
+                allocation[index] += take
+                count -= take
+                progressed = True
+        if not progressed:
+            break
+    return allocation
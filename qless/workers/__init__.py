@@ -6,6 +6,8 @@ from __future__ import print_function
 
 import os
 import code
+import glob
+import uuid
 import signal
 import shutil
 import sys
@@ -14,11 +16,13 @@ import threading
 from contextlib import contextmanager
 
 from six import string_types
-from six.moves import zip_longest
+from six.moves import queue, zip_longest
 
 # Internal imports
 from qless.listener import Listener
-from qless import logger, exceptions
+from .backoff import Constant
+from .heartbeat import Heartbeater
+from qless import logger, exceptions, util
 
 # Try to use the fast json parser
 try:
@@ -39,6 +43,17 @@ except ImportError:  # pragma: no cover
 
 class Worker(object):
     '''Worker. For doing work'''
+    # The modification time that marks a sandbox as clean, in the 'lazy' and
+    # 'async' modes. Adding anything to it, or removing anything, changes it
+    CLEAN = 0
+    # Directories being deleted in the background, and the process for which
+    # they're being deleted
+    _trash = None
+    _trash_pid = None
+    _trash_lock = threading.Lock()
+    # The sandboxes for which we've looked for leftover directories to delete
+    _swept = set()
+
     @classmethod
     def title(cls, message=None):
         '''Set the title of the process'''
@@ -73,18 +88,91 @@ class Worker(object):
 
     @classmethod
     @contextmanager
-    def sandbox(cls, path):
-        '''Ensures path exists before yielding, cleans up after'''
-        # Ensure the path exists and is clean
-        if not os.path.exists(path):
-            logger.debug('Making %s' % path)
-            os.makedirs(path)
-        cls.clean(path)
+    def sandbox(cls, path, mode='eager'):
+        '''Ensures path exists before yielding, cleans up after.
+
+        In the 'eager' mode, it's cleaned out both times. In the 'lazy' mode,
+        it's only looked in when its modification time shows that it's been
+        used since it was last cleaned. The 'async' mode is like the 'lazy'
+        one, except that a used directory is moved out of the way, replaced
+        with an empty one, and deleted in a background thread.'''
+        if mode == 'eager':
+            # Ensure the path exists and is clean
+            if not os.path.exists(path):
+                logger.debug('Making %s' % path)
+                os.makedirs(path)
+            cls.clean(path)
+        elif mode in ('lazy', 'async'):
+            cls.tidy(path, mode)
+        else:
+            raise exceptions.QlessException('Unknown sandbox mode %s' % mode)
         # Then yield, but make sure to clean up the directory afterwards
         try:
             yield
         finally:
-            cls.clean(path)
+            if mode == 'eager':
+                cls.clean(path)
+            else:
+                cls.tidy(path, mode)
+
+    @classmethod
+    def tidy(cls, path, mode='lazy'):
+        '''Ensure that path exists, and clean it if it's been used'''
+        try:
+            if os.stat(path).st_mtime == cls.CLEAN:
+                return
+        except OSError:
+            logger.debug('Making %s' % path)
+            os.makedirs(path)
+        else:
+            if mode == 'async':
+                cls.replace(path)
+            else:
+                cls.clean(path)
+        os.utime(path, (cls.CLEAN, cls.CLEAN))
+
+    @classmethod
+    def replace(cls, path):
+        '''Swap path for an empty directory, and delete the old one in the
+        background'''
+        path = os.path.realpath(path)
+        cwd = os.path.realpath(os.getcwd())
+        trash = '%s.trash-%s' % (path, uuid.uuid4().hex)
+        os.rename(path, trash)
+        os.makedirs(path)
+        # Otherwise, we'd be left working in the directory being deleted
+        if cwd == path or cwd.startswith(path + os.sep):
+            os.chdir(path)
+        if path not in Worker._swept:
+            # Anything left behind by a process that stopped before it could
+            # delete it
+            Worker._swept.add(path)
+            for leftover in glob.glob(path + '.trash-*'):
+                if leftover != trash:
+                    cls.trash(leftover)
+        cls.trash(trash)
+
+    @classmethod
+    def trash(cls, path):
+        '''Delete the directory at path in a background thread'''
+        with Worker._trash_lock:
+            if Worker._trash_pid != os.getpid():
+                # Threads don't survive forking, so each process needs its own
+                Worker._trash_pid = os.getpid()
+                Worker._trash = queue.Queue()
+                thread = threading.Thread(
+                    target=cls.empty_trash, args=(Worker._trash,))
+                thread.daemon = True
+                thread.start()
+            Worker._trash.put(path)
+
+    @staticmethod
+    def empty_trash(trash):
+        '''Delete each of the directories put in the trash'''
+        for path in iter(trash.get, None):
+            logger.debug('Removing directory %s' % path)
+            shutil.rmtree(path, ignore_errors=True)
+            trash.task_done()
 
     def __init__(self, queues, client, **kwargs):
         self.client = client
@@ -104,8 +192,49 @@ class Worker(object):
         self.resume = kwargs.get('resume') or []
         if self.resume == True:
             self.resume = self.resumable()
-        # How frequently we should poll for work
+        # How frequently we should poll for work, and how long to wait after
+        # each pass over our queues that finds nothing
         self.interval = kwargs.get('interval', 60)
+        self.backoff = kwargs.get('backoff') or Constant(self.interval)
+        # How many passes over our queues we've made, and how many were empty
+        self.polls = 0
+        self.empty_polls = 0
+        # Whether to wake up as soon as a job is put in one of our queues,
+        # rather than waiting out the interval. This means subscribing to the
+        # log of every job event, which is a lot of messages on a busy system
+        self.notify = kwargs.get('notify', False)
+        # Set when there may be work in one of our queues
+        self.available = threading.Event()
+        # Whether to heartbeat the jobs we're working on, so they don't have to
+        self.heartbeat = kwargs.get('heartbeat', False)
+        # Whether to pop jobs from all of our queues at once, and how to
+        # choose between them: 'round-robin' takes jobs from each queue in
+        # turn, up to its weight at a time, while 'priority' takes them from
+        # the first queues first. Without one, we pop from each queue in turn
+        self.strategy = kwargs.get('strategy')
+        self.weights = kwargs.get('weights')
+        # How many jobs to pop from a queue at a time. Jobs we've popped but
+        # not yet handed out are kept, along with how long their locks last,
+        # in a buffer for each queue, or under None for those popped from all
+        # of our queues at once
+        self.prefetch = kwargs.get('prefetch', 0)
+        self.buffers = {}
+        self._buffers_lock = threading.Lock()
+        # Renews locks in the background: those of the jobs we're working on,
+        # if we're heartbeating them, and those of the jobs we've buffered
+        self.heartbeater = None
+        if self.heartbeat or self.prefetch or self.strategy:
+            self.heartbeater = Heartbeater(self)
+        # How many jobs to work on, and how much memory (in bytes) to grow to,
+        # before stopping so that a fresh process can take over
+        self.max_jobs = kwargs.get('max_jobs')
+        self.max_rss = kwargs.get('max_rss')
+        if self.max_rss and util.rss() is None:  # pragma: no cover
+            logger.warn('Memory use is unknown here, so max_rss is ignored')
+            self.max_rss = None
+        self.processed = 0
+        # How to keep each job's sandbox clean: 'eager', 'lazy' or 'async'
+        self.sandbox_mode = kwargs.get('sandbox_mode', 'eager')
         # To mark whether or not we should shutdown after work is done
         self.shutdown = False
 
@@ -131,35 +260,215 @@ class Worker(object):
                     yield job
             except exceptions.LostLockException:
                 logger.exception('Cannot resume %s' % job.jid)
-        while True:
-            seen = False
+        try:
+            while True:
+                # Between passes, rather than between the jobs of one, since
+                # the jobs of a pass have already been popped
+                if self.recycle():
+                    self.shutdown = True
+                    return
+                seen = False
+                # Anything put from here on should wake us if we don't find
+                # work
+                self.available.clear()
+                self.polls += 1
+                for job in self.pop_many():
+                    if not seen:
+                        seen = True
+                        self.backoff.reset()
+                    self.processed += 1
+                    yield job
+                if not seen:
+                    self.empty_polls += 1
+                    yield None
+        finally:
+            self.release()
+
+    def recycle(self):
+        '''Whether we've worked on as many jobs, or grown as large, as we
+        should before making way for a fresh process'''
+        if self.max_jobs and self.processed >= self.max_jobs:
+            logger.info('Recycling after %i jobs', self.processed)
+            return True
+        if self.max_rss:
+            rss = util.rss()
+            if rss is not None and rss >= self.max_rss:
+                logger.info('Recycling at %i bytes resident', rss)
+                return True
+        return False
+
+    @contextmanager
+    def working(self, job):
+        '''Keep the lock on a job alive while we work on it, if we're
+        heartbeating jobs'''
+        if not self.heartbeat:
+            yield
+            return
+        self.heartbeater.add(job)
+        try:
+            yield
+        finally:
+            self.heartbeater.remove(job)
+
+    def pop_many(self):
+        '''The next jobs to work on. By default, that's a job from each of our
+        queues, popped as they're needed. With a strategy, jobs are popped
+        from all of our queues at once, and kept with those we've prefetched
+        until they're handed out'''
+        if self.strategy is None or len(self.queues) < 2:
             for queue in self.queues:
-                job = queue.pop()
+                job = self.pop(queue)
                 if job:
-                    seen = True
                     yield job
-            if not seen:
-                yield None
+            return
+        with self._buffers_lock:
+            buffered = self.buffers.setdefault(None, [])
+            if not buffered:
+                buffered.extend([job, job.ttl] for job in self.client.pop_many(
+                    self.queues, len(self.queues) * max(self.prefetch, 1),
+                    self.strategy, self.weights))
+                self.heartbeater.start()
+        while True:
+            self.renew()
+            with self._buffers_lock:
+                buffered = self.buffers.get(None)
+                if not buffered:
+                    return
+                job = buffered.pop(0)[0]
+            yield job
+
+    def pop(self, queue):
+        '''Pop a job from the queue, or if we're prefetching, take one from
+        those we've already popped from it, refilling them if need be'''
+        if not self.prefetch:
+            return queue.pop()
+        self.renew()
+        with self._buffers_lock:
+            buffered = self.buffers.setdefault(queue.name, [])
+            if not buffered:
+                buffered.extend(
+                    [job, job.ttl] for job in queue.pop(self.prefetch))
+                self.heartbeater.start()
+            return buffered and buffered.pop(0)[0] or None
+
+    def renew(self):
+        '''Heartbeat the jobs we've prefetched that have used up half of
+        their locks, dropping those we've lost. This is done between jobs,
+        and in the background by our heartbeater'''
+        with self._buffers_lock:
+            due = [entry for buffered in self.buffers.values()
+                for entry in buffered if entry[0].ttl < entry[1] / 2]
+        if not due:
+            return
+        results = self._batched(
+            [entry[0] for entry in due],
+            lambda job: ('heartbeat', job.jid, job.client.worker_name))
+        lost = set()
+        for entry in due:
+            result = results[entry[0].jid]
+            if isinstance(result, Exception):
+                logger.warn('Lost prefetched job %s', entry[0].jid)
+                lost.add(entry[0].jid)
+            else:
+                entry[0].expires_at = float(result)
+        if lost:
+            self.discard(*lost)
+
+    def release(self):
+        '''Put the jobs we've prefetched but not started back in their
+        queues, so other workers can have them. They keep their priority,
+        tags, dependencies and the retries they have left'''
+        with self._buffers_lock:
+            jobs = [entry[0] for buffered in self.buffers.values()
+                for entry in buffered]
+            self.buffers = {}
+        if jobs:
+            logger.info('Releasing %i prefetched jobs', len(jobs))
+            self._batched(jobs, lambda job: ('put', job.queue_name, job.jid,
+                job.klass_name, job._encoded_data(), 0,
+                'priority', job.priority,
+                'tags', json.dumps(job.tags),
+                'retries', job.retries_left,
+                'depends', json.dumps(job.dependencies)))
+
+    def discard(self, *jids):
+        '''Forget about prefetched jobs, if we have them'''
+        jids = set(jids)
+        with self._buffers_lock:
+            for buffered in self.buffers.values():
+                buffered[:] = [
+                    entry for entry in buffered if entry[0].jid not in jids]
+
+    @staticmethod
+    def _batched(jobs, command):
+        '''Send the command returned by ``command(job)`` for each job, in one
+        batch for each client, returning a dictionary of jids to the result or
+        the exception each command raised'''
+        batches = {}
+        futures = []
+        for job in jobs:
+            batch = batches.get(id(job.client))
+            if batch is None:
+                batch = batches[id(job.client)] = job.client.batch()
+            futures.append((job.jid, batch(*command(job))))
+        for batch in batches.values():
+            batch.flush()
+        return dict(
+            (jid, future.exception or future.result())
+            for jid, future in futures)
+
+    @property
+    def empty_rate(self):
+        '''The fraction of passes over our queues that found no work'''
+        return float(self.empty_polls) / (self.polls or 1)
+
+    def idle(self):
+        '''How long to wait, having found no work, according to our backoff
+        policy'''
+        interval = self.backoff()
+        logger.debug('Sleeping for %fs (%.1f%% of polls empty)',
+            interval, self.empty_rate * 100)
+        return interval
+
+    def wait(self, timeout):
+        '''Sleep until there may be work for us, for at most timeout seconds.
+        Unless we're notified of new jobs, that's the whole timeout'''
+        self.available.wait(timeout)
 
     @contextmanager
     def listener(self):
         '''Listen for pubsub messages relevant to this worker in a thread'''
         channels = ['ql:w:' + self.client.worker_name]
-        listener = Listener(self.client.redis, channels)
-        thread = threading.Thread(target=self.listen, args=(listener,))
-        thread.start()
+        if self.notify:
+            channels.append('ql:log')
+        # A sharded client has a connection to each of its shards
+        listeners = [Listener(client.redis, channels)
+            for client in getattr(self.client, 'clients', [self.client])]
+        threads = [threading.Thread(target=self.listen, args=(listener,))
+            for listener in listeners]
+        for thread in threads:
+            thread.start()
         try:
             yield
         finally:
-            listener.unlisten()
-            thread.join()
+            for listener in listeners:
+                listener.unlisten()
+            for thread in threads:
+                thread.join()
 
     def listen(self, listener):
         '''Listen for events that affect our ownership of a job'''
+        queue_names = set(queue.name for queue in self.queues)
         for message in listener.listen():
             try:
                 data = json.loads(message['data'])
-                if data['event'] in ('canceled', 'lock_lost', 'put'):
+                if message['channel'] == 'ql:log':
+                    # A job was put in one of our queues
+                    if (data.get('event') == 'put' and
+                        data.get('queue') in queue_names):
+                        self.available.set()
+                elif data['event'] in ('canceled', 'lock_lost', 'put'):
+                    self.discard(data['jid'])
                     self.kill(data['jid'])
             except:
                 logger.exception('Pubsub error')
@@ -168,6 +477,17 @@ class Worker(object):
         '''Stop processing the provided jid'''
         raise NotImplementedError('Derived classes must override "kill"')
 
+    def lose(self, jid):
+        '''Stop processing the provided jid, having found that we've lost its
+        lock on another thread. Workers that can only kill jobs from the main
+        thread override this to get it done there'''
+        self.kill(jid)
+
+    def finish(self):
+        '''Tidy up once we've stopped working on jobs'''
+        if self.heartbeater is not None:
+            self.heartbeater.stop()
+
     def signals(self, signals=('QUIT', 'USR1', 'USR2')):
         '''Register our signal handler'''
         for sig in signals:
@@ -0,0 +1,156 @@
+'''The asyncio-based worker, in coroutine functions that can't be defined
+before Python 3.5'''
+
+import os
+import asyncio
+import traceback
+from six import next
+
+from . import Worker
+from qless import logger
+
+
+class AsyncioWorker(Worker):
+    '''A worker that runs jobs concurrently on one event loop. The methods of
+    their classes must be coroutine functions:
+
+        class FanOut(object):
+            @staticmethod
+            async def process(job):
+                ...
+                job.complete()
+
+    Up to `concurrency` jobs run at once. Jobs are popped and completed with
+    the worker's client as usual, so those calls block the loop while they're
+    made. When we lose the lock on a job, its task is cancelled.'''
+    def __init__(self, *args, **kwargs):
+        Worker.__init__(self, *args, **kwargs)
+        # Should we shut down after this?
+        self.shutdown = False
+        # A mapping of jids to the tasks handling them
+        self.tasks = {}
+        self.concurrency = kwargs.pop('concurrency', 10)
+        # The event loop we run on, while we're running
+        self.loop = None
+        # A list of the sandboxes that we'll use
+        self.sandbox = kwargs.pop(
+            'sandbox', os.path.join(os.getcwd(), 'qless-py-workers'))
+        self.sandboxes = [os.path.join(self.sandbox, 'task-%i' % i)
+            for i in range(self.concurrency)]
+
+    @classmethod
+    def prepare(cls, path):
+        '''Ensure the path exists and is clean'''
+        if not os.path.exists(path):
+            logger.debug('Making %s' % path)
+            os.makedirs(path)
+        cls.clean(path)
+
+    async def scrub(self, sandbox, eager):
+        '''Get a sandbox ready for a job, or clean up after one, with `eager`
+        in the 'eager' sandbox mode'''
+        if self.sandbox_mode == 'async':
+            # A stat, and a rename if it's been used, so it's done right here
+            self.tidy(sandbox, 'async')
+        elif self.sandbox_mode == 'lazy':
+            await self.loop.run_in_executor(None, self.tidy, sandbox)
+        else:
+            # Files can take a while to clean up, so it's done off the loop
+            await self.loop.run_in_executor(None, eager, sandbox)
+
+    async def process(self, job, slots):
+        '''Process a job, in a sandbox, freeing its slot when done'''
+        sandbox = self.sandboxes.pop(0)
+        try:
+            await self.scrub(sandbox, self.prepare)
+            try:
+                job.sandbox = sandbox
+                with self.working(job):
+                    await self.call(job)
+            finally:
+                await self.scrub(sandbox, self.clean)
+        except asyncio.CancelledError:
+            logger.warn('Cancelled %s', job.jid)
+        except Exception:
+            logger.exception('Failed to process %s', job.jid)
+        finally:
+            # Delete its entry from our tasks mapping
+            self.tasks.pop(job.jid, None)
+            self.sandboxes.append(sandbox)
+            slots.release()
+
+    async def call(self, job):
+        '''Run the job's coroutine function, failing the job if it raises'''
+        method = job._method(coroutine=True)
+        if method:
+            try:
+                logger.info('Processing %s in %s', job.jid, job.queue_name)
+                await method(job)
+                logger.info('Completed %s in %s', job.jid, job.queue_name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # Make error type based on exception type
+                logger.exception('Failed %s in %s: %s',
+                    job.jid, job.queue_name, repr(method))
+                job.fail(job.queue_name + '-' + exc.__class__.__name__,
+                    traceback.format_exc())
+
+    def kill(self, jid):
+        '''Cancel the task processing the provided jid'''
+        task = self.tasks.get(jid)
+        if task is not None:
+            logger.warn('Lost ownership of %s' % jid)
+            # We're told about this in the listener's thread
+            self.loop.call_soon_threadsafe(task.cancel)
+
+    async def sleep(self, timeout):
+        '''Sleep until there may be work for us, for at most timeout seconds,
+        letting jobs run in the meantime'''
+        deadline = self.loop.time() + timeout
+        while not self.available.is_set():
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(
+                min(remaining, self.notify and 0.1 or remaining))
+
+    async def work(self):
+        '''Start tasks for jobs as there's room for them'''
+        slots = asyncio.Semaphore(self.concurrency)
+        generator = self.jobs()
+        try:
+            while not self.shutdown:
+                await slots.acquire()
+                try:
+                    job = next(generator)
+                except StopIteration:
+                    logger.info('Exhausted jobs')
+                    break
+                if job:
+                    # Import the job's class before it's needed
+                    job.klass
+                    self.tasks[job.jid] = self.loop.create_task(
+                        self.process(job, slots))
+                else:
+                    slots.release()
+                    await self.sleep(self.idle())
+        finally:
+            logger.info('Waiting for tasks to finish')
+            tasks = list(self.tasks.values())
+            if tasks:
+                await asyncio.wait(tasks)
+
+    def run(self):
+        '''Work on jobs'''
+        # Register signal handlers
+        self.signals()
+
+        self.loop = asyncio.new_event_loop()
+        try:
+            # Start listening
+            with self.listener():
+                self.loop.run_until_complete(self.work())
+        finally:
+            self.loop.close()
+            self.finish()
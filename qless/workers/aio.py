@@ -0,0 +1,10 @@
+'''An asyncio-based worker, for jobs whose methods are coroutine functions'''
+
+import sys
+
+# Coroutine functions can't be defined before Python 3.5, so they're kept in
+# a module that's only imported after this check
+if sys.version_info < (3, 5):  # pragma: no cover
+    raise ImportError('qless.workers.aio requires Python 3.5 or later')
+
+from qless.workers._aio import AsyncioWorker
@@ -0,0 +1,70 @@
+'''Scaling the number of forked workers with the work waiting for them'''
+
+import math
+import time
+
+from qless import logger
+
+
+class Autoscaler(object):
+    '''Decides how many children a forking worker should run, between
+    `minimum` and `maximum`, from how many jobs are waiting in its queues.
+
+    Every `interval` seconds, it counts the jobs that are waiting (or stalled)
+    in the queues. If there are more than `backlog` jobs for each child, it
+    adds enough children to bring it back down to that at once. It only stops
+    children once there are fewer than `hysteresis` times that many jobs for
+    each of the children that would be left, and only one at a time, so that
+    a backlog that hovers around the threshold doesn't start and stop children
+    over and over. After each change, it waits out the `cooldown` before
+    making another.'''
+    def __init__(self, minimum, maximum, backlog=10, interval=5, cooldown=30,
+        hysteresis=0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backlog = backlog
+        self.interval = interval
+        self.cooldown = cooldown
+        self.hysteresis = hysteresis
+        # When we last counted the jobs waiting, and last changed the count
+        self.sampled = 0
+        self.changed = 0
+
+    def clamp(self, count):
+        '''The provided number of children, within our bounds'''
+        return max(self.minimum, min(self.maximum, count))
+
+    def waiting(self, queues):
+        '''How many jobs are waiting to be worked on in the queues'''
+        total = 0
+        for queue in queues:
+            counts = queue.counts
+            total += counts.get('waiting', 0) + counts.get('stalled', 0)
+        return total
+
+    def target(self, waiting, current):
+        '''How many children there should be with this many jobs waiting,
+        given how many there are'''
+        up = int(math.ceil(float(waiting) / self.backlog))
+        down = int(math.ceil(float(waiting) / (self.backlog * self.hysteresis)))
+        if up > current:
+            return self.clamp(up)
+        elif down < current:
+            return self.clamp(current - 1)
+        return self.clamp(current)
+
+    def __call__(self, queues, current):
+        '''How many children there should be, given how many there are'''
+        now = time.time()
+        if now - self.sampled < self.interval:
+            return self.clamp(current)
+        self.sampled = now
+        waiting = self.waiting(queues)
+        target = self.target(waiting, current)
+        if target != current:
+            if now - self.changed < self.cooldown:
+                return self.clamp(current)
+            logger.info('Scaling from %i to %i workers for %i waiting jobs',
+                current, target, waiting)
+            self.changed = now
+        return target
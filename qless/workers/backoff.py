@@ -0,0 +1,58 @@
+'''How long idle workers wait before looking for work again'''
+
+import random
+
+
+class Constant(object):
+    '''Always wait the same interval'''
+    def __init__(self, interval):
+        self.interval = interval
+
+    def __call__(self):
+        '''How long to wait after another pass without finding work'''
+        return self.interval
+
+    def reset(self):
+        '''We found work, so start over'''
+        pass
+
+
+class Exponential(Constant):
+    '''Wait `base` seconds, then `factor` times longer after each pass without
+    finding work, up to `cap`. With `jitter`, a random time between `base` and
+    that is waited instead, so that workers that went idle together don't all
+    look for work together'''
+    def __init__(self, base, cap, factor=2, jitter=True):
+        Constant.__init__(self, base)
+        self.cap = cap
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0
+
+    def __call__(self):
+        delay = min(self.cap, self.interval * self.factor ** self.attempts)
+        # Once we've reached the cap, there's no need to count any higher
+        if delay < self.cap:
+            self.attempts += 1
+        if self.jitter:
+            return random.uniform(self.interval, max(self.interval, delay))
+        return delay
+
+    def reset(self):
+        self.attempts = 0
+
+
+class DecorrelatedJitter(Constant):
+    '''Wait a random time between `base` seconds and three times the last
+    wait, up to `cap`. This spreads workers out while still backing off'''
+    def __init__(self, base, cap):
+        Constant.__init__(self, base)
+        self.cap = cap
+        self.last = base
+
+    def __call__(self):
+        self.last = min(self.cap, random.uniform(self.interval, self.last * 3))
+        return self.last
+
+    def reset(self):
+        self.last = self.interval
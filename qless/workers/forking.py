@@ -1,6 +1,11 @@
 '''A worker that forks child processes'''
 
 import os
+import gc
+import errno
+import time
+import importlib
+import itertools
 import multiprocessing
 import signal
 
@@ -9,6 +14,7 @@ from six import string_types
 # Internal imports
 from . import Worker
 from qless import logger, util
+from qless.job import BaseJob
 from .serial import SerialWorker
 
 try:
@@ -25,8 +31,24 @@ class ForkingWorker(Worker):
         self.klass = self.kwargs.pop('klass', SerialWorker)
         # How many children to launch
         self.count = self.kwargs.pop('workers', 0) or NUM_CPUS
+        # How many jobs each child works on, and how much memory (in bytes)
+        # it grows to, before it's replaced. Each child's limits are
+        # staggered by up to `stagger` either way, so they aren't all
+        # replaced at once
+        self.max_jobs = self.kwargs.pop('max_jobs_per_child', None)
+        self.max_rss = self.kwargs.pop('max_rss_per_child', None)
+        self.stagger = self.kwargs.pop('stagger', 0.1)
+        # Job classes and modules to import before forking
+        self.preload = self.kwargs.pop('preload', None) or []
+        # Decides how many children to run as the work waiting changes
+        self.autoscaler = self.kwargs.pop('autoscaler', None)
+        if self.autoscaler is not None:
+            self.count = self.autoscaler.clamp(self.count)
         # A dictionary of child pids to information about them
         self.sandboxes = {}
+        self.indexes = {}
+        # The children we've asked to stop, and that we shouldn't replace
+        self.retiring = set()
         # Whether or not we're supposed to shutdown
         self.shutdown = False
 
@@ -50,6 +72,48 @@ class ForkingWorker(Worker):
                 logger.exception('Error waiting for %i...' % cpid)
             finally:
                 self.sandboxes.pop(cpid, None)
+                self.indexes.pop(cpid, None)
+
+    def load(self):
+        '''Import the job classes and modules to preload, and then freeze
+        everything allocated so far. Frozen objects are never examined by the
+        garbage collector, so children don't write to (and copy) the pages
+        they share with us when they collect'''
+        # Collections while importing would leave holes in pages that later
+        # allocations fill in, in the parent or in children
+        gc.disable()
+        try:
+            for name in self.preload:
+                module, _, attr = name.rpartition('.')
+                try:
+                    if module and hasattr(
+                        importlib.import_module(module), attr):
+                        # A job class, imported as a job would be so that
+                        # children don't import it again unless it's changed
+                        BaseJob._import(name)
+                    else:
+                        importlib.import_module(name)
+                    logger.info('Preloaded %s' % name)
+                except Exception:
+                    logger.exception('Failed to preload %s' % name)
+            gc.collect()
+            # Only available since Python 3.7
+            if hasattr(gc, 'freeze'):
+                gc.freeze()
+        finally:
+            gc.enable()
+
+    def limits(self, index):
+        '''The limits for the child with the provided index, spread evenly
+        around the limits we were given'''
+        factor = 1 + 2 * self.stagger * (
+            (index + 0.5) / max(self.count, index + 1) - 0.5)
+        limits = {}
+        if self.max_jobs:
+            limits['max_jobs'] = max(int(round(self.max_jobs * factor)), 1)
+        if self.max_rss:
+            limits['max_rss'] = int(self.max_rss * factor)
+        return limits
 
     def spawn(self, **kwargs):
         '''Return a new worker for a child process'''
@@ -62,42 +126,92 @@ class ForkingWorker(Worker):
             self.klass = util.import_class(self.klass)
         return self.klass(self.queues, self.client, **copy)
 
+    def fork(self, index, **kwargs):
+        '''Fork a child worker with the provided index'''
+        # The sandbox for the child worker
+        sandbox = os.path.join(
+            os.getcwd(), 'qless-py-workers', 'sandbox-%s' % index)
+        cpid = os.fork()
+        if cpid:
+            logger.info('Spawned worker %i' % cpid)
+            self.sandboxes[cpid] = sandbox
+            self.indexes[cpid] = index
+            return cpid
+        else:  # pragma: no cover
+            # Move to the sandbox as the current working directory
+            with Worker.sandbox(sandbox):
+                os.chdir(sandbox)
+                limits = self.limits(index)
+                limits.update(kwargs)
+                self.spawn(sandbox=sandbox, **limits).run()
+                exit(0)
+
+    def reap(self, pid, status):
+        '''Replace a child that's exited, unless we asked it to'''
+        self.sandboxes.pop(pid, None)
+        index = self.indexes.pop(pid)
+        if pid in self.retiring:
+            self.retiring.discard(pid)
+            logger.info('Worker %i retired' % pid)
+            return
+        if status:
+            logger.warn('Worker %i died with status %i from signal %i' % (
+                pid, status >> 8, status & 0xff))
+        else:
+            # It was recycled, or ran out of work
+            logger.info('Worker %i exited' % pid)
+        self.fork(index)
+
+    def scale(self):
+        '''Start or stop children as our autoscaler sees fit'''
+        active = [pid for pid in self.sandboxes if pid not in self.retiring]
+        self.count = self.autoscaler(self.queues, len(active))
+        if self.count > len(active):
+            used = set(self.indexes.values())
+            free = (index for index in itertools.count() if index not in used)
+            for index in itertools.islice(free, self.count - len(active)):
+                self.fork(index)
+        else:
+            # Children with the highest indexes go first. Like any worker sent
+            # QUIT, they finish the jobs they're working on first
+            for pid in sorted(active, key=self.indexes.get)[self.count:]:
+                logger.info('Retiring worker %i' % pid)
+                self.retiring.add(pid)
+                try:
+                    os.kill(pid, signal.SIGQUIT)
+                except OSError:  # pragma: no cover
+                    logger.exception('Error stopping %s...' % pid)
+
     def run(self):
         '''Run this worker'''
         self.signals(('TERM', 'INT', 'QUIT'))
+        if self.preload:
+            self.load()
         # Divide up the jobs that we have to divy up between the workers. This
         # produces evenly-sized groups of jobs
         resume = self.divide(self.resume, self.count)
         for index in range(self.count):
-            # The sandbox for the child worker
-            sandbox = os.path.join(
-                os.getcwd(), 'qless-py-workers', 'sandbox-%s' % index)
-            cpid = os.fork()
-            if cpid:
-                logger.info('Spawned worker %i' % cpid)
-                self.sandboxes[cpid] = sandbox
-            else:  # pragma: no cover
-                # Move to the sandbox as the current working directory
-                with Worker.sandbox(sandbox):
-                    os.chdir(sandbox)
-                    self.spawn(resume=resume[index], sandbox=sandbox).run()
-                    exit(0)
+            self.fork(index, resume=resume[index])
 
         try:
             while not self.shutdown:
-                pid, status = os.wait()
-                logger.warn('Worker %i died with status %i from signal %i' % (
-                    pid, status >> 8, status & 0xff))
-                sandbox = self.sandboxes.pop(pid)
-                cpid = os.fork()
-                if cpid:
-                    logger.info('Spawned replacement worker %i' % cpid)
-                    self.sandboxes[cpid] = sandbox
-                else:  # pragma: no cover
-                    with Worker.sandbox(sandbox):
-                        os.chdir(sandbox)
-                        self.spawn(sandbox=sandbox).run()
-                        exit(0)
+                if self.autoscaler is None:
+                    pid, status = os.wait()
+                else:
+                    # We can't block waiting for children when we also have
+                    # to check on the queues
+                    try:
+                        pid, status = os.waitpid(-1, os.WNOHANG)
+                    except OSError as exc:
+                        # We may have scaled down to no children at all
+                        if exc.errno != errno.ECHILD:
+                            raise
+                        pid, status = 0, 0
+                    if not pid:
+                        self.scale()
+                        time.sleep(min(self.autoscaler.interval, 1))
+                        continue
+                self.reap(pid, status)
         finally:
             self.stop(signal.SIGKILL)
 
@@ -1,6 +1,7 @@
 '''A Gevent-based worker'''
 
 import os
+import time
 import gevent
 import gevent.pool
 from six import next
@@ -29,9 +30,10 @@ class GeventWorker(Worker):
         '''Process a job'''
         sandbox = self.sandboxes.pop(0)
         try:
-            with Worker.sandbox(sandbox):
-                job.sandbox = sandbox
-                job.process()
+            with Worker.sandbox(sandbox, self.sandbox_mode):
+                with self.working(job):
+                    job.sandbox = sandbox
+                    job.process()
         finally:
             # Delete its entry from our greenlets mapping
             self.greenlets.pop(job.jid, None)
@@ -44,6 +46,16 @@ class GeventWorker(Worker):
             logger.warn('Lost ownership of %s' % jid)
             greenlet.kill()
 
+    def wait(self, timeout):
+        '''Sleep until there may be work for us, for at most timeout seconds,
+        letting other greenlets run in the meantime'''
+        deadline = time.time() + timeout
+        while not self.available.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            gevent.sleep(min(remaining, self.notify and 0.1 or remaining))
+
     @classmethod
     def patch(cls):  # pragma: no cover
         '''Monkey-patch anything that needs to be patched'''
@@ -76,10 +88,10 @@ class GeventWorker(Worker):
                         self.greenlets[job.jid] = greenlet
                         self.pool.start(greenlet)
                     else:
-                        logger.debug('Sleeping for %fs' % self.interval)
-                        gevent.sleep(self.interval)
+                        self.wait(self.idle())
             except StopIteration:
                 logger.info('Exhausted jobs')
             finally:
                 logger.info('Waiting for greenlets to finish')
                 self.pool.join()
+                self.finish()
@@ -0,0 +1,84 @@
+'''Heartbeating the jobs a worker is working on'''
+
+import threading
+
+# Internal imports
+from qless import logger
+
+
+class Heartbeater(object):
+    '''Keeps the locks of a worker's jobs alive while it works on them. Every
+    `interval` seconds, the jobs that have used up `fraction` of their locks
+    are heartbeated together, in one round trip for each client and without
+    sending their data. If we've lost the lock on a job, the worker is told
+    with ``Worker.lose``. Jobs that have since been completed (or failed,
+    retried, moved or canceled) are expected to fail, and are just dropped.'''
+    def __init__(self, worker, interval=1, fraction=0.5):
+        self.worker = worker
+        self.interval = interval
+        self.fraction = fraction
+        # A mapping of jids to the job and how long its lock lasts
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, job):
+        '''Start heartbeating a job'''
+        with self._lock:
+            self._jobs[job.jid] = (job, job.ttl)
+        self.start()
+
+    def start(self):
+        '''Start heartbeating in the background, if we aren't already'''
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def remove(self, job):
+        '''Stop heartbeating a job'''
+        with self._lock:
+            self._jobs.pop(job.jid, None)
+
+    def stop(self):
+        '''Stop heartbeating altogether'''
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        '''Heartbeat jobs until stopped, along with those the worker has popped
+        but not yet started'''
+        while not self._stopped.wait(self.interval):
+            try:
+                self.renew()
+                self.worker.renew()
+            except Exception:
+                logger.exception('Failed to heartbeat jobs')
+
+    def renew(self):
+        '''Heartbeat the jobs that are due'''
+        with self._lock:
+            due = [job for job, lease in self._jobs.values()
+                if job.ttl < lease * self.fraction]
+        if not due:
+            return
+        logger.debug('Heartbeating %i jobs', len(due))
+        results = self.worker._batched(due,
+            lambda job: ('heartbeat', job.jid, job.client.worker_name))
+        for job in due:
+            result = results[job.jid]
+            if not isinstance(result, Exception):
+                job.expires_at = float(result)
+                continue
+            self.remove(job)
+            if getattr(job, 'state_changed', False):
+                logger.debug('Stopped heartbeating finished job %s', job.jid)
+                continue
+            logger.warn('Lost the lock on %s: %s', job.jid, result)
+            try:
+                self.worker.lose(job.jid)
+            except Exception:
+                logger.exception('Failed to kill %s', job.jid)
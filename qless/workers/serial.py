@@ -1,7 +1,7 @@
 '''A worker that serially pops and complete jobs'''
 
 import os
-import time
+import signal
 
 from . import Worker
 
@@ -12,6 +12,8 @@ class SerialWorker(Worker):
         Worker.__init__(self, *args, **kwargs)
         # The jid that we're working on at the moment
         self.jid = None
+        # The jid we've found we've lost the lock on in another thread
+        self.lost = None
         # This is the sandbox we use
         self.sandbox = kwargs.pop(
             'sandbox', os.path.join(os.getcwd(), 'qless-py-workers'))
@@ -21,23 +23,48 @@ class SerialWorker(Worker):
         if jid == self.jid:
             exit(1)
 
+    def lose(self, jid):
+        '''Exiting on another thread would only end that thread, so we
+        signal ourselves to kill the job on the main thread instead'''
+        if jid == self.jid:
+            self.lost = jid
+            os.kill(os.getpid(), signal.SIGURG)
+
+    def signals(self, signals=('QUIT', 'USR1', 'USR2', 'URG')):
+        '''Register our signal handler, including for lost jobs'''
+        Worker.signals(self, signals)
+
+    def handler(self, signum, frame):  # pragma: no cover
+        '''Signal handler for this process'''
+        if signum == signal.SIGURG:
+            # URG - We've lost the lock on a job
+            self.kill(self.lost)
+        else:
+            Worker.handler(self, signum, frame)
+
     def run(self):
         '''Run jobs, popping one after another'''
         # Register our signal handlers
         self.signals()
 
-        with self.listener():
-            for job in self.jobs():
-                # If there was no job to be had, we should sleep a little bit
-                if not job:
-                    self.jid = None
-                    self.title('Sleeping for %fs' % self.interval)
-                    time.sleep(self.interval)
-                else:
-                    self.jid = job.jid
-                    self.title('Working on %s (%s)' % (job.jid, job.klass_name))
-                    with Worker.sandbox(self.sandbox):
-                        job.sandbox = self.sandbox
-                        job.process()
-                if self.shutdown:
-                    break
+        try:
+            with self.listener():
+                for job in self.jobs():
+                    # If there was no job to be had, we should sleep a bit
+                    if not job:
+                        self.jid = None
+                        interval = self.idle()
+                        self.title('Sleeping for %fs' % interval)
+                        self.wait(interval)
+                    else:
+                        self.jid = job.jid
+                        self.title(
+                            'Working on %s (%s)' % (job.jid, job.klass_name))
+                        with Worker.sandbox(self.sandbox, self.sandbox_mode):
+                            with self.working(job):
+                                job.sandbox = self.sandbox
+                                job.process()
+                    if self.shutdown:
+                        break
+        finally:
+            self.finish()
@@ -0,0 +1,89 @@
+'''A thread-based worker'''
+
+import os
+import threading
+from six import next
+from six.moves import queue
+
+from . import Worker
+from qless import logger
+
+
+class ThreadPoolWorker(Worker):
+    '''A worker that runs jobs concurrently on a pool of threads, sharing its
+    client. Threads can't be interrupted, so when we lose the lock on a job,
+    its `killed` event is set, and it's up to the job to notice and stop'''
+    def __init__(self, *args, **kwargs):
+        Worker.__init__(self, *args, **kwargs)
+        # Should we shut down after this?
+        self.shutdown = False
+        # A mapping of jids to the jobs being worked on
+        self.running = {}
+        count = kwargs.pop('threads', 10)
+        # Jobs are handed to the threads through this queue, as there are
+        # threads free to work on them
+        self.queue = queue.Queue()
+        self.free = threading.Semaphore(count)
+        # A list of the sandboxes that we'll use, one for each thread
+        self.sandbox = kwargs.pop(
+            'sandbox', os.path.join(os.getcwd(), 'qless-py-workers'))
+        self.sandboxes = [
+            os.path.join(self.sandbox, 'thread-%i' % i) for i in range(count)]
+
+    def work(self, sandbox):
+        '''Work on the jobs handed to this thread until handed ``None``'''
+        for job in iter(self.queue.get, None):
+            try:
+                with Worker.sandbox(sandbox, self.sandbox_mode):
+                    with self.working(job):
+                        job.sandbox = sandbox
+                        job.process()
+            except Exception:
+                logger.exception('Failed to process %s', job.jid)
+            finally:
+                self.running.pop(job.jid, None)
+                self.free.release()
+
+    def kill(self, jid):
+        '''Tell the job with the provided jid to stop'''
+        job = self.running.get(jid)
+        if job is not None:
+            logger.warn('Lost ownership of %s' % jid)
+            job.killed.set()
+
+    def run(self):
+        '''Work on jobs'''
+        # Register signal handlers
+        self.signals()
+
+        threads = [threading.Thread(target=self.work, args=(sandbox,))
+            for sandbox in self.sandboxes]
+        for thread in threads:
+            thread.start()
+
+        # Start listening
+        with self.listener():
+            try:
+                generator = self.jobs()
+                while not self.shutdown:
+                    self.free.acquire()
+                    job = next(generator)
+                    if job:
+                        # Import the job's class here, rather than in several
+                        # threads at once
+                        job.klass
+                        job.killed = threading.Event()
+                        self.running[job.jid] = job
+                        self.queue.put(job)
+                    else:
+                        self.free.release()
+                        self.wait(self.idle())
+            except StopIteration:
+                logger.info('Exhausted jobs')
+            finally:
+                logger.info('Waiting for threads to finish')
+                for thread in threads:
+                    self.queue.put(None)
+                for thread in threads:
+                    thread.join()
+                self.finish()
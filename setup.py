@@ -34,6 +34,15 @@ stats, notifications, and a whole lot more.''',
     extras_require       = {
         'ps': [
             'setproctitle'
+        ],
+        'aio': [
+            'redis>=4.2'
+        ],
+        'msgpack': [
+            'msgpack'
+        ],
+        'orjson': [
+            'orjson'
         ]
     },
     install_requires     = [
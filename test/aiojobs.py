@@ -0,0 +1,23 @@
+'''Jobs with coroutine methods, which can't be defined before Python 3.5'''
+
+import asyncio
+
+
+class AsyncJob(object):
+    '''Dummy class'''
+    @staticmethod
+    async def foo(job):
+        '''Dummy job'''
+        job.data['sandbox'] = job.sandbox
+        await asyncio.sleep(job.data.get('sleep', 0))
+        job.complete()
+
+    @staticmethod
+    async def failing(job):
+        '''A job that raises an exception'''
+        raise ValueError('Failing')
+
+    @staticmethod
+    def plain(job):
+        '''A job that isn't a coroutine function'''
+        job.complete()
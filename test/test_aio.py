@@ -0,0 +1,132 @@
+'''Tests about the asyncio client'''
+
+import unittest
+
+from common import TestQless
+
+try:
+    import asyncio
+    from qless import aio
+except (ImportError, SyntaxError):  # pragma: no cover
+    aio = None
+
+
+@unittest.skipIf(aio is None, 'qless.aio requires Python 3')
+class TestAio(TestQless):
+    '''Test the asyncio client'''
+    def setUp(self):
+        TestQless.setUp(self)
+        self.loop = asyncio.new_event_loop()
+        self.aio = aio.Client(hostname='worker')
+
+    def tearDown(self):
+        self.sync(self.aio.close())
+        self.loop.close()
+        TestQless.tearDown(self)
+
+    def sync(self, coroutine):
+        '''Run a coroutine to completion'''
+        return self.loop.run_until_complete(coroutine)
+
+    def test_put_pop(self):
+        '''Can put and pop jobs'''
+        queue = self.aio.queues['foo']
+        jid = self.sync(queue.put('Foo', {'whiz': 'bang'}))
+        self.assertEqual(self.client.jobs[jid].data, {'whiz': 'bang'})
+        self.assertEqual(self.sync(queue.peek()).jid, jid)
+        job = self.sync(queue.pop())
+        self.assertEqual(job.jid, jid)
+        self.assertEqual(self.sync(queue.pop(10)), [])
+
+    def test_complete(self):
+        '''Can complete jobs'''
+        jid = self.client.queues['foo'].put('Foo', {})
+        job = self.sync(self.aio.queues['foo'].pop())
+        job['foo'] = 'bar'
+        self.sync(job.complete())
+        self.assertEqual(self.client.jobs[jid].state, 'complete')
+        self.assertEqual(self.client.jobs[jid]['foo'], 'bar')
+
+    def test_fail(self):
+        '''Can fail jobs'''
+        jid = self.client.queues['foo'].put('Foo', {})
+        job = self.sync(self.aio.queues['foo'].pop())
+        self.sync(job.fail('foo', 'bar'))
+        self.assertEqual(self.client.jobs[jid].state, 'failed')
+
+    def test_heartbeat(self):
+        '''Can heartbeat jobs, and raises on lost locks'''
+        jid = self.client.queues['foo'].put('Foo', {})
+        job = self.sync(self.aio.queues['foo'].pop())
+        self.assertGreater(self.sync(job.heartbeat()), 0)
+        self.client.jobs[jid].timeout()
+        self.assertRaises(
+            aio.LostLockException, self.sync, job.heartbeat())
+
+    def test_retry(self):
+        '''Can retry jobs'''
+        jid = self.client.queues['foo'].put('Foo', {})
+        job = self.sync(self.aio.queues['foo'].pop())
+        self.sync(job.retry())
+        self.assertEqual(self.client.jobs[jid].state, 'waiting')
+
+    def test_priority(self):
+        '''Priority must be set with a coroutine'''
+        jid = self.client.queues['foo'].put('Foo', {})
+        job = self.sync(self.aio.jobs[jid])
+        self.assertRaises(AttributeError, setattr, job, 'priority', 10)
+        self.sync(job.set_priority(10))
+        self.assertEqual(self.client.jobs[jid].priority, 10)
+
+    def test_jobs(self):
+        '''Can get jobs'''
+        self.assertEqual(self.sync(self.aio.jobs['jid']), None)
+        jid = self.client.queues['foo'].put('Foo', {})
+        self.assertEqual(self.sync(self.aio.jobs[jid]).jid, jid)
+        self.assertEqual(
+            [job.jid for job in self.sync(self.aio.jobs.get(jid))], [jid])
+        self.client.queues['foo'].recur('Foo', {}, 60, jid='recurring')
+        self.assertIsInstance(
+            self.sync(self.aio.jobs['recurring']), aio.RecurringJob)
+        found = self.sync(self.aio.jobs.lookup(jid, 'jid', 'recurring'))
+        self.assertEqual(found[0].jid, jid)
+        self.assertEqual(found[1], None)
+        self.assertIsInstance(found[2], aio.RecurringJob)
+
+    def test_recurring(self):
+        '''Recurring jobs are updated with coroutines'''
+        self.client.queues['foo'].recur('Foo', {}, 60, jid='recurring')
+        job = self.sync(self.aio.jobs['recurring'])
+        for key in ('priority', 'retries', 'interval', 'data', 'klass'):
+            self.assertRaises(AttributeError, setattr, job, key, 10)
+        self.sync(job.set_interval(30))
+        self.assertEqual(job.interval, 30)
+        self.assertEqual(self.client.jobs['recurring'].interval, 30)
+
+    def test_process(self):
+        '''Jobs can't be processed with the asyncio client'''
+        self.client.queues['foo'].put('Foo', {})
+        job = self.sync(self.aio.queues['foo'].pop())
+        self.assertRaises(NotImplementedError, job.process)
+
+    def test_config(self):
+        '''Can get and set config'''
+        config = self.aio.config
+        self.assertEqual(self.sync(config.get('foo', 5)), 5)
+        self.sync(config.set('foo', 10))
+        self.assertEqual(self.sync(config.get('foo')), 10)
+        self.assertEqual(self.sync(config.all())['foo'], 10)
+        self.sync(config.unset('foo'))
+        self.assertEqual(self.sync(config.get('foo')), None)
+
+    def test_events(self):
+        '''Can iterate over events'''
+        self.client.queues['foo'].put('Foo', {}, jid='jid')
+        self.client.track('jid')
+        events = self.aio.events.__aiter__()
+        # Give the subscription a chance to happen before popping
+        pending = asyncio.ensure_future(events.__anext__(), loop=self.loop)
+        self.sync(asyncio.sleep(0.1))
+        self.client.queues['foo'].pop()
+        self.assertEqual(self.sync(pending), ('popped', 'jid'))
+        self.sync(events.aclose())
@@ -0,0 +1,98 @@
+'''Test the asyncio worker'''
+
+# Internal imports
+from common import TestQless
+
+import time
+import unittest
+from six import next
+
+try:
+    import asyncio
+    from aiojobs import AsyncJob
+    from qless.workers.aio import AsyncioWorker
+except (ImportError, SyntaxError):  # pragma: no cover
+    AsyncioWorker = None
+
+
+if AsyncioWorker is not None:
+    class LimitedAsyncioWorker(AsyncioWorker):
+        '''A worker that limits the number of jobs it runs'''
+        def jobs(self):
+            '''Yield only a few jobs'''
+            generator = AsyncioWorker.jobs(self)
+            for _ in range(5):
+                yield next(generator)
+
+        def listen(self, _):
+            '''Don't actually listen for pubsub events'''
+            pass
+
+        def signals(self):
+            '''Do not set any signal handlers'''
+            pass
+
+
+@unittest.skipIf(AsyncioWorker is None, 'AsyncioWorker requires Python 3.5')
+class TestWorker(TestQless):
+    '''Test the worker'''
+    def setUp(self):
+        TestQless.setUp(self)
+        self.worker = LimitedAsyncioWorker(
+            ['foo'], self.client, concurrency=5, interval=0.2)
+        self.queue = self.client.queues['foo']
+
+    def test_basic(self):
+        '''Can complete jobs concurrently'''
+        jids = [self.queue.put(AsyncJob, {'sleep': 0.2}) for _ in range(5)]
+        before = time.time()
+        self.worker.run()
+        self.assertLess(time.time() - before, 0.8)
+        states = [self.client.jobs[jid].state for jid in jids]
+        self.assertEqual(states, ['complete'] * 5)
+        sandboxes = set(
+            self.client.jobs[jid].data['sandbox'] for jid in jids)
+        self.assertEqual(len(sandboxes), 5)
+
+    def test_fails(self):
+        '''Fails jobs that raise exceptions'''
+        jid = self.client.queues['failing'].put(AsyncJob, {})
+        LimitedAsyncioWorker(['failing'], self.client, interval=0.2).run()
+        job = self.client.jobs[jid]
+        self.assertEqual(job.state, 'failed')
+        self.assertEqual(job.failure['group'], 'failing-ValueError')
+
+    def test_method_type(self):
+        '''Fails jobs whose methods aren't coroutine functions, and the other
+        way around for other workers'''
+        jid = self.client.queues['plain'].put(AsyncJob, {})
+        LimitedAsyncioWorker(['plain'], self.client, interval=0.2).run()
+        job = self.client.jobs[jid]
+        self.assertEqual(job.failure['group'], 'plain-method-type')
+        self.queue.put(AsyncJob, {}, jid='jid')
+        self.queue.pop().process()
+        self.assertEqual(
+            self.client.jobs['jid'].failure['group'], 'foo-method-type')
+
+    def test_sleeps(self):
+        '''Make sure the worker sleeps if there aren't jobs to be had'''
+        for _ in range(4):
+            self.queue.put(AsyncJob, {})
+        before = time.time()
+        self.worker.run()
+        self.assertGreater(time.time() - before, 0.2)
+
+    def test_kill(self):
+        '''Cancels the tasks for jobs it loses the lock on'''
+        self.worker.loop = asyncio.new_event_loop()
+        task = self.worker.loop.create_task(asyncio.sleep(1))
+        self.worker.tasks['foo'] = task
+        self.worker.kill('foo')
+        self.assertRaises(asyncio.CancelledError,
+            self.worker.loop.run_until_complete, task)
+        self.worker.loop.close()
+
+    def test_kill_dead(self):
+        '''Does not panic if the task handling a job is no longer around'''
+        # This test succeeds if it finishes without an exception
+        self.worker.kill('foo')
@@ -0,0 +1,128 @@
+'''Test autoscaling forked workers'''
+
+# Internal imports
+from common import TestQless
+
+import mock
+import signal
+import unittest
+import itertools
+from six import next
+
+# The stuff we're actually testing
+from qless.workers.autoscale import Autoscaler
+from qless.workers.forking import ForkingWorker
+
+
+class FakeQueue(object):
+    '''A queue with the provided counts'''
+    def __init__(self, waiting, stalled=0):
+        self.counts = {'waiting': waiting, 'stalled': stalled, 'running': 100}
+
+
+class TestAutoscaler(unittest.TestCase):
+    '''Test deciding how many workers to run'''
+    def setUp(self):
+        self.autoscaler = Autoscaler(1, 8, backlog=10, interval=0, cooldown=0)
+
+    def test_waiting(self):
+        '''Counts the waiting and stalled jobs in every queue'''
+        self.assertEqual(
+            self.autoscaler.waiting([FakeQueue(5, 2), FakeQueue(3)]), 10)
+
+    def test_scale_up(self):
+        '''Scales up to keep the backlog for each worker down'''
+        self.assertEqual(self.autoscaler([FakeQueue(45)], 2), 5)
+
+    def test_maximum(self):
+        '''Never scales above the maximum'''
+        self.assertEqual(self.autoscaler([FakeQueue(1000)], 2), 8)
+
+    def test_hysteresis(self):
+        '''Only scales down once the backlog is well below the threshold'''
+        self.assertEqual(self.autoscaler([FakeQueue(25)], 4), 4)
+        self.assertEqual(self.autoscaler([FakeQueue(15)], 4), 3)
+
+    def test_scale_down(self):
+        '''Scales down one worker at a time, to the minimum'''
+        self.assertEqual(self.autoscaler([FakeQueue(0)], 4), 3)
+        self.assertEqual(self.autoscaler([FakeQueue(0)], 1), 1)
+
+    def test_cooldown(self):
+        '''Doesn't change the count again until the cooldown is over'''
+        autoscaler = Autoscaler(1, 8, backlog=10, interval=0, cooldown=30)
+        with mock.patch('time.time', return_value=1000):
+            self.assertEqual(autoscaler([FakeQueue(45)], 2), 5)
+        with mock.patch('time.time', return_value=1010):
+            self.assertEqual(autoscaler([FakeQueue(80)], 5), 5)
+        with mock.patch('time.time', return_value=1031):
+            self.assertEqual(autoscaler([FakeQueue(80)], 5), 8)
+
+    def test_interval(self):
+        '''Only counts the jobs waiting every so often'''
+        autoscaler = Autoscaler(1, 8, interval=5, cooldown=0)
+        queue = mock.Mock(counts={'waiting': 0})
+        with mock.patch('time.time', return_value=1000):
+            autoscaler([queue], 2)
+        queue.counts = {'waiting': 1000}
+        with mock.patch('time.time', return_value=1002):
+            self.assertEqual(autoscaler([queue], 1), 1)
+
+
+class PatchedForkingWorker(ForkingWorker):
+    '''A forking worker that pretends to fork'''
+    pids = itertools.count(1000)
+
+    def fork(self, index, **kwargs):
+        '''Record a pretend child with the provided index'''
+        cpid = next(self.pids)
+        self.sandboxes[cpid] = 'sandbox-%i' % index
+        self.indexes[cpid] = index
+        return cpid
+
+
+class TestForkingAutoscale(TestQless):
+    '''Test a forking worker scaling its children'''
+    def setUp(self):
+        TestQless.setUp(self)
+        self.autoscaler = mock.Mock(return_value=2, clamp=lambda count: count)
+        self.worker = PatchedForkingWorker(
+            ['foo'], self.client, workers=2, autoscaler=self.autoscaler)
+        for index in range(2):
+            self.worker.fork(index)
+
+    def test_scale_up(self):
+        '''Forks children with the lowest free indexes'''
+        self.autoscaler.return_value = 4
+        self.worker.scale()
+        self.assertEqual(sorted(self.worker.indexes.values()), [0, 1, 2, 3])
+        self.assertEqual(self.worker.count, 4)
+
+    def test_scale_down(self):
+        '''Asks the children with the highest indexes to finish up'''
+        self.autoscaler.return_value = 4
+        self.worker.scale()
+        self.autoscaler.return_value = 3
+        with mock.patch('os.kill') as kill:
+            self.worker.scale()
+            retiring = [pid for pid, index in self.worker.indexes.items()
+                if index == 3]
+            kill.assert_called_once_with(retiring[0], signal.SIGQUIT)
+        self.assertEqual(self.worker.retiring, set(retiring))
+
+    def test_retired(self):
+        '''Retired children aren't replaced, but others are'''
+        self.autoscaler.return_value = 1
+        with mock.patch('os.kill'):
+            self.worker.scale()
+        retired = list(self.worker.retiring)[0]
+        with mock.patch.object(self.worker, 'fork') as fork:
+            self.worker.reap(retired, 0)
+            self.assertFalse(fork.called)
+            self.worker.reap(list(self.worker.indexes)[0], 9)
+            fork.assert_called_once_with(0)
+        self.assertEqual(self.worker.retiring, set())
+
+    def test_not_passed_on(self):
+        '''Children aren't given the autoscaler'''
+        self.assertNotIn('autoscaler', self.worker.kwargs)
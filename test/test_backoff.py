@@ -0,0 +1,72 @@
+'''Test the idle backoff policies'''
+
+# Internal imports
+from common import TestQless
+
+import unittest
+from six import next
+
+# The stuff we're actually testing
+from qless.workers import Worker
+from qless.workers.backoff import Constant, Exponential, DecorrelatedJitter
+
+
+class TestBackoff(unittest.TestCase):
+    '''Test the backoff policies'''
+    def test_constant(self):
+        '''Always waits the same time'''
+        backoff = Constant(5)
+        self.assertEqual([backoff() for _ in range(3)], [5, 5, 5])
+
+    def test_exponential(self):
+        '''Waits longer each time, up to the cap, until reset'''
+        backoff = Exponential(1, 10, jitter=False)
+        self.assertEqual([backoff() for _ in range(5)], [1, 2, 4, 8, 10])
+        backoff.reset()
+        self.assertEqual(backoff(), 1)
+
+    def test_exponential_jitter(self):
+        '''With jitter, waits between the base and the exponential delay'''
+        backoff = Exponential(1, 10)
+        for delay in [1, 2, 4, 8, 10, 10]:
+            self.assertTrue(1 <= backoff() <= delay)
+
+    def test_exponential_bounded(self):
+        '''Keeps waiting the cap, however long it goes without work'''
+        backoff = Exponential(1.0, 60)
+        for _ in range(5000):
+            self.assertTrue(1 <= backoff() <= 60)
+        backoff = Exponential(1.0, 60, jitter=False)
+        for _ in range(5000):
+            backoff()
+        self.assertEqual(backoff(), 60)
+
+    def test_decorrelated_jitter(self):
+        '''Waits between the base and the cap'''
+        backoff = DecorrelatedJitter(1, 10)
+        for _ in range(100):
+            self.assertTrue(1 <= backoff() <= 10)
+        backoff.reset()
+        self.assertLessEqual(backoff(), 3)
+
+
+class TestWorkerBackoff(TestQless):
+    '''Test how workers back off'''
+    def test_default(self):
+        '''By default, workers wait their interval'''
+        worker = Worker(['foo'], self.client, interval=5)
+        self.assertEqual(worker.idle(), 5)
+
+    def test_reset(self):
+        '''Finding work resets the backoff, and empty polls are counted'''
+        worker = Worker(['foo'], self.client,
+            backoff=Exponential(1, 10, jitter=False))
+        jobs = worker.jobs()
+        self.assertEqual(next(jobs), None)
+        self.assertEqual([worker.idle(), worker.idle()], [1, 2])
+        self.client.queues['foo'].put('Foo', {})
+        self.assertNotEqual(next(jobs), None)
+        self.assertEqual(worker.idle(), 1)
+        self.assertEqual(next(jobs), None)
+        self.assertEqual((worker.polls, worker.empty_polls), (3, 2))
+        self.assertAlmostEqual(worker.empty_rate, 2.0 / 3)
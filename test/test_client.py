@@ -1,5 +1,9 @@
 '''Basic tests about the client'''
 
+import mock
+import redis
+
+import qless
 from common import TestQless
 
 
@@ -18,6 +22,24 @@ class TestClient(TestQless):
         '''Throws AttributeError for non-attributes'''
         self.assertRaises(AttributeError, lambda: self.client.foo)
 
+    def test_script_flushed(self):
+        '''Recovers if the script is flushed from the server'''
+        self.client.queues['foo'].put('Foo', {}, jid='jid')
+        self.redis.execute_command('script', 'flush')
+        self.assertEqual(self.client.jobs['jid'].jid, 'jid')
+        self.redis.execute_command('script', 'flush')
+        with self.client.batch() as batch:
+            future = batch('get', 'jid')
+        self.assertNotEqual(future.result(), None)
+
+    def test_script_loaded_once(self):
+        '''Only loads the script into a server that doesn't have it'''
+        self.client.queues['foo'].put('Foo', {}, jid='jid')
+        with mock.patch.object(qless.Client().redis.__class__,
+            'script_load') as script_load:
+            qless.Client().jobs['jid']
+            self.assertFalse(script_load.called)
+
     def test_tags(self):
         '''Provides access to top tags'''
         self.assertEqual(self.client.tags(), {})
@@ -38,6 +60,232 @@ class TestClient(TestQless):
             self.assertEqual(self.client.jobs[jid].state, 'waiting')
 
 
+class TestBatch(TestQless):
+    '''Test batches of commands'''
+    def test_basic(self):
+        '''Commands are only sent when the batch is flushed'''
+        batch = self.client.batch()
+        future = batch('put', 'foo', 'jid', 'Foo', '{}', 0)
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(self.client.jobs['jid'], None)
+        batch.flush()
+        self.assertEqual(future.result(), 'jid')
+        self.assertEqual(self.client.jobs['jid'].queue_name, 'foo')
+
+    def test_context_manager(self):
+        '''Batches flush on exiting the block'''
+        with self.client.batch() as batch:
+            futures = [
+                batch('put', 'foo', jid, 'Foo', '{}', 0) for jid in 'abc']
+        self.assertEqual([future.result() for future in futures], list('abc'))
+
+    def test_context_manager_exception(self):
+        '''Batches are discarded if the block raises'''
+        try:
+            with self.client.batch() as batch:
+                batch('put', 'foo', 'jid', 'Foo', '{}', 0)
+                raise ValueError('foo')
+        except ValueError:
+            pass
+        self.assertEqual(self.client.jobs['jid'], None)
+
+    def test_unresolved(self):
+        '''Asking for a result before flushing raises an exception'''
+        future = self.client.batch()('put', 'foo', 'jid', 'Foo', '{}', 0)
+        self.assertRaises(qless.QlessException, future.result)
+
+    def test_errors(self):
+        '''Each failed command raises its own exception'''
+        with self.client.batch() as batch:
+            bad = batch('put', 'foo', 'jid', 'Foo', 'not json', 0)
+            good = batch('put', 'foo', 'jid', 'Foo', '{}', 0)
+        self.assertRaises(qless.QlessException, bad.result)
+        self.assertIsInstance(bad.exception, qless.QlessException)
+        self.assertEqual(good.result(), 'jid')
+
+    def test_publish(self):
+        '''Messages are published after the commands, in the same round trip'''
+        pubsub = self.redis.pubsub()
+        pubsub.subscribe('channel')
+        pubsub.get_message(timeout=1)
+        with self.client.batch() as batch:
+            future = batch('put', 'foo', 'jid', 'Foo', '{}', 0)
+            batch.publish('channel', 'message')
+        self.assertEqual(future.result(), 'jid')
+        message = pubsub.get_message(timeout=1)
+        self.assertEqual(message['data'], b'message')
+        pubsub.close()
+
+
+class TestPopMany(TestQless):
+    '''Test popping from several queues at once'''
+    def setUp(self):
+        TestQless.setUp(self)
+        self.jids = dict((name, [
+            self.client.queues[name].put('Foo', {}) for _ in range(3)])
+            for name in ('foo', 'bar'))
+
+    def test_priority(self):
+        '''Drains the queues in order'''
+        jobs = self.client.pop_many(['foo', 'bar'], 4)
+        self.assertEqual(
+            [job.jid for job in jobs],
+            self.jids['foo'] + self.jids['bar'][:1])
+
+    def test_round_robin(self):
+        '''Takes jobs from each queue in turn'''
+        jobs = self.client.pop_many(['foo', 'bar'], 4, 'round-robin')
+        self.assertEqual(
+            sorted(job.queue_name for job in jobs), ['bar', 'bar', 'foo', 'foo'])
+
+    def test_weights(self):
+        '''Takes more jobs from more heavily-weighted queues'''
+        jobs = self.client.pop_many(
+            ['foo', 'bar'], 3, 'round-robin', {'foo': 2})
+        self.assertEqual(
+            sorted(job.queue_name for job in jobs), ['bar', 'foo', 'foo'])
+
+    def test_paused(self):
+        '''Doesn't take jobs from paused queues'''
+        self.client.queues['foo'].pause()
+        jobs = self.client.pop_many(['foo', 'bar'], 6)
+        self.assertEqual([job.jid for job in jobs], self.jids['bar'])
+
+    def test_empty(self):
+        '''Takes one round trip when there's nothing to pop'''
+        with mock.patch.object(qless.Client, '__call__') as call:
+            self.assertEqual(self.client.pop_many(['baz', 'qux'], 2), [])
+            self.assertFalse(call.called)
+
+    def test_short(self):
+        '''Takes the jobs a queue comes up short on from the others'''
+        allocate = qless.util.allocate
+        raced = []
+
+        def race(*args):
+            # Another worker pops from foo after we've counted its jobs
+            if not raced:
+                raced.extend(self.client.queues['foo'].pop(2))
+            return allocate(*args)
+
+        with mock.patch('qless.util.allocate', side_effect=race):
+            jobs = self.client.pop_many(['foo', 'bar'], 4)
+        self.assertEqual(
+            [job.jid for job in jobs], self.jids['foo'][2:] + self.jids['bar'])
+
+    def test_unknown_strategy(self):
+        '''Raises an exception for unknown strategies'''
+        self.assertRaises(qless.QlessException,
+            self.client.pop_many, ['foo'], 1, 'random')
+
+
+class TestReplica(TestQless):
+    '''Test routing read-only commands to a replica'''
+    def setUp(self):
+        TestQless.setUp(self)
+        # A primary is always fresh enough to act as its own replica
+        self.client = qless.Client(replica='redis://localhost:6379')
+        self.client.queues['foo'].put('Foo', {}, jid='jid', tags=['foo'])
+
+    def test_fresh(self):
+        '''Read-only commands go to the replica'''
+        with mock.patch.object(self.client, '_lua') as lua:
+            self.assertEqual(self.client.jobs.tagged('foo')['jobs'], ['jid'])
+            self.assertFalse(lua.called)
+
+    def test_side_effects(self):
+        '''Commands that write as a side effect go to the primary'''
+        with mock.patch.object(self.client, '_replica_lua') as lua:
+            self.assertEqual(self.client.queues['foo'].peek().jid, 'jid')
+            self.assertEqual(self.client.queues['foo'].counts['waiting'], 1)
+            self.assertFalse(lua.called)
+
+    def test_stale(self):
+        '''Stale replicas are not used'''
+        info = {'role': 'slave', 'master_link_status': 'up',
+            'master_last_io_seconds_ago': self.client.max_staleness + 1}
+        with mock.patch.object(self.client.replica, 'info', return_value=info):
+            with mock.patch.object(self.client, '_replica_lua') as lua:
+                self.assertEqual(
+                    self.client.jobs.tagged('foo')['jobs'], ['jid'])
+                self.assertFalse(lua.called)
+
+    def test_fallback(self):
+        '''Commands the replica refuses or can't take go to the primary'''
+        for exc in (redis.ResponseError('READONLY You can\'t write'),
+            redis.ResponseError('Error running script: @user_script:1: '
+                '-READONLY You can\'t write'),
+            redis.ConnectionError('gone')):
+            with mock.patch.object(
+                self.client, '_replica_lua', side_effect=exc):
+                self.assertEqual(
+                    self.client.jobs.tagged('foo')['jobs'], ['jid'])
+
+    def test_errors(self):
+        '''Other errors from the replica are raised, not retried'''
+        exc = redis.ResponseError('Failed(): bad arguments')
+        with mock.patch.object(self.client, '_replica_lua', side_effect=exc):
+            with mock.patch.object(self.client, '_lua') as lua:
+                self.assertRaises(qless.QlessException,
+                    self.client.read, 'failed', 'foo')
+                self.assertFalse(lua.called)
+
+    def test_no_replica(self):
+        '''Without a replica, reads go to the primary'''
+        client = qless.Client()
+        self.assertEqual(client.jobs.tagged('foo')['jobs'], ['jid'])
+
+
+class TestBulk(TestQless):
+    '''Test operations on many jobs at once'''
+    def setUp(self):
+        TestQless.setUp(self)
+        self.jids = [
+            self.client.queues['foo'].put('Foo', {'i': i}) for i in range(5)]
+
+    def test_tag(self):
+        '''Can tag and untag many jobs'''
+        report = self.client.jobs.bulk(self.jids, chunk_size=2).tag('bar')
+        self.assertEqual(set(report.results), set(self.jids))
+        self.assertEqual(report.errors, {})
+        self.assertEqual(
+            set(self.client.jobs.tagged('bar')['jobs']), set(self.jids))
+        self.client.jobs.bulk(self.jids).untag('bar')
+        self.assertEqual(self.client.jobs.tagged('bar')['jobs'], {})
+
+    def test_priority(self):
+        '''Can set the priority of many jobs'''
+        self.client.jobs.bulk(self.jids).priority(10)
+        for job in self.client.jobs.get(*self.jids):
+            self.assertEqual(job.priority, 10)
+
+    def test_move(self):
+        '''Can move many jobs, reporting those that don't exist'''
+        report = self.client.jobs.bulk(self.jids + ['missing']).move('bar')
+        self.assertEqual(set(report.results), set(self.jids))
+        self.assertEqual(list(report.errors), ['missing'])
+        for index, job in enumerate(self.client.jobs.get(*self.jids)):
+            self.assertEqual(job.queue_name, 'bar')
+            self.assertEqual(job.data, {'i': index})
+
+    def test_retry(self):
+        '''Can retry many running jobs'''
+        self.client.queues['foo'].pop(5)
+        report = self.client.jobs.bulk(self.jids).retry()
+        self.assertEqual(report.errors, {})
+        for job in self.client.jobs.get(*self.jids):
+            self.assertEqual(job.state, 'waiting')
+
+    def test_cancel(self):
+        '''Can cancel jobs given by an iterator, reporting progress'''
+        progress = []
+        self.client.jobs.bulk(iter(self.jids), chunk_size=2,
+            progress=lambda done, total: progress.append((done, total))
+        ).cancel()
+        self.assertEqual(progress, [(2, None), (4, None), (5, None)])
+        self.assertEqual(self.client.jobs.get(*self.jids), [])
+
+
 class TestJobs(TestQless):
     '''Test the Jobs class'''
     def test_basic(self):
@@ -52,6 +300,19 @@ class TestJobs(TestQless):
         self.client.queues['foo'].recur('Foo', {}, 60, jid='jid')
         self.assertNotEqual(self.client.jobs['jid'], None)
 
+    def test_lookup(self):
+        '''Can look up jobs and recurring jobs in batches'''
+        self.client.queues['foo'].put('Foo', {}, jid='jid')
+        self.client.queues['foo'].recur('Foo', {}, 60, jid='recurring')
+        with mock.patch.object(qless.Client, '__call__') as call:
+            job, recurring, missing = self.client.jobs.lookup(
+                'jid', 'recurring', 'missing')
+            self.assertFalse(call.called)
+        self.assertIsInstance(job, qless.Job)
+        self.assertIsInstance(recurring, qless.RecurringJob)
+        self.assertEqual(missing, None)
+        self.assertEqual(self.client.jobs.lookup(), [])
+
     def test_complete(self):
         '''Can give us access to complete jobs'''
         self.assertEqual(self.client.jobs.complete(), [])
@@ -59,6 +320,36 @@ class TestJobs(TestQless):
         self.client.queues['foo'].pop().complete()
         self.assertEqual(self.client.jobs.complete(), ['jid'])
 
+    def test_iter_complete(self):
+        '''Can iterate over all the complete jobs'''
+        queue = self.client.queues['foo']
+        jids = [queue.put('Foo', {}) for _ in range(5)]
+        for job in queue.pop(5):
+            job.complete()
+        self.assertEqual(
+            set(self.client.jobs.iter_complete(count=2)), set(jids))
+        self.assertEqual(
+            set(job.jid for job in self.client.jobs.iter_complete(2, True)),
+            set(jids))
+
+    def test_iter_tagged(self):
+        '''Can iterate over all the tagged jobs'''
+        self.assertEqual(list(self.client.jobs.iter_tagged('foo')), [])
+        queue = self.client.queues['foo']
+        jids = [queue.put('Foo', {}, tags=['foo']) for _ in range(5)]
+        self.assertEqual(
+            set(self.client.jobs.iter_tagged('foo', count=2)), set(jids))
+
+    def test_iter_failed(self):
+        '''Can iterate over all the failed jobs in a group'''
+        queue = self.client.queues['foo']
+        jids = [queue.put('Foo', {}) for _ in range(5)]
+        for job in queue.pop(5):
+            job.fail('foo', 'bar')
+        self.assertEqual(
+            set(job.jid for job in self.client.jobs.iter_failed(
+                'foo', count=2, hydrate=True)), set(jids))
+
     def test_tracked(self):
         '''Gives us access to tracked jobs'''
         self.assertEqual(self.client.jobs.tracked(),
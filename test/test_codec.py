@@ -0,0 +1,90 @@
+'''Tests about encoding and decoding job data'''
+
+import unittest
+import simplejson as json
+
+import qless
+from common import TestQless
+from qless.codec import Codec, Codecs
+
+
+class ReprCodec(Codec):
+    '''A codec that doesn't produce JSON'''
+    name = 'repr'
+    json = False
+
+    def dumps(self, data):
+        return repr(data)
+
+    def loads(self, raw):
+        return eval(raw)
+
+
+class TestCodecs(unittest.TestCase):
+    '''Test the codec registry'''
+    def setUp(self):
+        self.codecs = Codecs()
+        self.codecs.register(ReprCodec())
+
+    def test_json(self):
+        '''JSON codecs produce plain JSON'''
+        raw = self.codecs.dumps({'foo': 'bar'})
+        self.assertEqual(json.loads(raw), {'foo': 'bar'})
+        self.assertEqual(self.codecs.loads(raw), {'foo': 'bar'})
+
+    def test_envelope(self):
+        '''Other codecs are wrapped in an envelope that names them'''
+        raw = self.codecs.dumps({'foo': 'bar'}, 'repr')
+        self.assertEqual(json.loads(raw)[Codecs.marker], 'repr')
+        self.assertEqual(self.codecs.loads(raw), {'foo': 'bar'})
+
+    def test_marker_in_data(self):
+        '''Data that looks like an envelope is kept as it was'''
+        for data in (
+            {Codecs.marker: 'repr', 'payload': '{}'},
+            {Codecs.marker: 'repr', 'payload': '{}', 'foo': 'bar'}):
+            self.assertEqual(self.codecs.loads(self.codecs.dumps(data)), data)
+
+    def test_nan(self):
+        '''Reads JSON that only some parsers accept'''
+        raw = json.dumps({'foo': float('inf')})
+        self.assertEqual(self.codecs.loads(raw), {'foo': float('inf')})
+
+    def test_names(self):
+        '''Lists the names of the registered codecs'''
+        self.assertIn('json', list(self.codecs))
+        self.assertIn('repr', list(self.codecs))
+
+    def test_unknown(self):
+        '''Unknown codecs raise an exception'''
+        self.assertRaises(qless.QlessException, Codecs, 'unknown')
+        raw = json.dumps({Codecs.marker: 'unknown', 'payload': ''})
+        self.assertRaises(qless.QlessException, self.codecs.loads, raw)
+
+    @unittest.skipIf('msgpack' not in Codecs(), 'msgpack is not installed')
+    def test_msgpack(self):
+        '''Can round-trip data through msgpack'''
+        raw = self.codecs.dumps({'foo': [1, 2.5, 'bar']}, 'msgpack')
+        self.assertEqual(self.codecs.loads(raw), {'foo': [1, 2.5, 'bar']})
+
+    @unittest.skipIf('orjson' not in Codecs(), 'orjson is not installed')
+    def test_orjson(self):
+        '''Can round-trip data through orjson'''
+        raw = self.codecs.dumps({'foo': [1, 2.5, 'bar']}, 'orjson')
+        self.assertEqual(json.loads(raw), {'foo': [1, 2.5, 'bar']})
+
+
+class TestClientCodecs(TestQless):
+    '''Test clients with different codecs'''
+    def test_mixed(self):
+        '''Clients can read data written with a different codec'''
+        other = qless.Client()
+        other.codecs.register(ReprCodec())
+        other.codecs.default = 'repr'
+        self.client.codecs.register(ReprCodec())
+        jid = other.queues['foo'].put('Foo', {'whiz': 'bang'})
+        self.assertEqual(self.client.jobs[jid].data, {'whiz': 'bang'})
+        job = self.client.queues['foo'].pop()
+        job['foo'] = 'bar'
+        job.complete()
+        self.assertEqual(other.jobs[jid].data, {'whiz': 'bang', 'foo': 'bar'})
@@ -1,5 +1,9 @@
 '''Tests about the config class'''
 
+import mock
+import time
+import threading
+import qless
 from common import TestQless
 
 
@@ -72,3 +76,83 @@ class TestConfig(TestQless):
         self.assertNotEqual(self.client.config.all, updated)
         self.client.config.update(updated)
         self.assertEqual(self.client.config.all, updated)
+
+
+class TestCachedConfig(TestQless):
+    '''Test the config class with caching'''
+    def setUp(self):
+        TestQless.setUp(self)
+        self.client = qless.Client(config_ttl=60)
+        self.other = qless.Client()
+
+    def test_cached(self):
+        '''Reading the config again doesn't go to Redis'''
+        self.assertEqual(self.client.config['heartbeat'], 60)
+        with mock.patch.object(self.client, '_lua') as lua:
+            self.assertEqual(self.client.config['heartbeat'], 60)
+            self.assertEqual(self.client.queues['foo'].heartbeat, 60)
+            self.assertFalse(lua.called)
+
+    def test_own_changes(self):
+        '''Our own changes are seen immediately'''
+        self.assertEqual(self.client.config['foo'], None)
+        self.client.config['foo'] = 5
+        self.assertEqual(self.client.config['foo'], 5)
+        del self.client.config['foo']
+        self.assertEqual(self.client.config['foo'], None)
+
+    def test_announced(self):
+        '''Changes are announced in the same round trip they're made in'''
+        with mock.patch.object(self.client.redis, 'publish') as publish:
+            with mock.patch.object(self.client.redis, 'pipeline',
+                wraps=self.client.redis.pipeline) as pipeline:
+                self.client.config['foo'] = 5
+                del self.client.config['foo']
+        self.assertEqual(pipeline.call_count, 2)
+        self.assertFalse(publish.called)
+
+    def test_invalidated(self):
+        '''Changes made by other clients are announced'''
+        self.assertEqual(self.client.config['foo'], None)
+        self.other.config['foo'] = 5
+        self.assertEqual(self.client.config['foo'], 5)
+
+    def test_expires(self):
+        '''Changes that aren't announced are seen when the cache expires'''
+        self.assertEqual(self.client.config['foo'], None)
+        self.redis.hset('ql:config', 'foo', 5)
+        self.assertEqual(self.client.config['foo'], None)
+        with mock.patch('qless.config.time.time',
+            return_value=time.time() + 61):
+            self.assertEqual(self.client.config['foo'], 5)
+
+    def test_changed_while_reading(self):
+        '''Changes made by other threads wait for readers to finish'''
+        self.assertEqual(self.client.config['heartbeat'], 60)
+        config = self.client.config
+        stale = config._stale
+        threads = []
+
+        def racing():
+            # Another thread changes the config just after we've checked it
+            result = stale()
+            thread = threading.Thread(target=config._drop)
+            thread.start()
+            threads.append(thread)
+            thread.join(0.1)
+            return result
+
+        with mock.patch.object(config, '_stale', side_effect=racing):
+            self.assertEqual(config['heartbeat'], 60)
+        threads[0].join()
+        self.assertEqual(config._cache, None)
+
+    def test_update(self):
+        '''Updates are sent in one round trip'''
+        with mock.patch.object(qless.Client, '__call__') as call:
+            self.client.config.update({'foo': 1, 'bar': 2})
+            self.assertFalse(call.called)
+        self.assertEqual(self.other.config['foo'], 1)
+        self.assertEqual(self.client.config['bar'], 2)
+        self.client.config.clear()
+        self.assertEqual(self.other.config['foo'], None)
@@ -0,0 +1,85 @@
+'''Tests about summarizing failed jobs'''
+
+from common import TestQless
+
+import unittest
+
+import qless
+from qless.failures import exception_name, signature
+
+
+def traceback(exception, line, func='process'):
+    '''A traceback for an exception raised from a line of a function'''
+    return '\n'.join([
+        'Traceback (most recent call last):',
+        '  File "/srv/app/qless/job.py", line 180, in process',
+        '    method(self)',
+        '  File "/srv/app/gnomes.py", line %i, in %s' % (line, func),
+        '    raise %s' % exception,
+        '%s: no underpants' % exception])
+
+
+class TestSignature(unittest.TestCase):
+    '''Test naming and signing failures'''
+    def test_exception_name(self):
+        '''Finds the exception class in the traceback, or else the group'''
+        self.assertEqual(exception_name(
+            'foo-KeyError', 'foo', traceback('ValueError', 1)), 'ValueError')
+        self.assertEqual(
+            exception_name('foo-KeyError', 'foo', 'Some message'), 'KeyError')
+        self.assertEqual(
+            exception_name('custom', 'foo', 'Some message'), 'custom')
+
+    def test_line_numbers(self):
+        '''Signatures ignore line numbers'''
+        self.assertEqual(
+            signature('KeyError', traceback('KeyError', 10)),
+            signature('KeyError', traceback('KeyError', 20)))
+
+    def test_different_places(self):
+        '''Signatures differ for different places and exceptions'''
+        self.assertNotEqual(
+            signature('KeyError', traceback('KeyError', 10)),
+            signature('KeyError', traceback('KeyError', 10, 'other')))
+        self.assertNotEqual(
+            signature('KeyError', 'Some message'),
+            signature('ValueError', 'Some message'))
+
+    def test_messages(self):
+        '''Without a traceback, numbers in the message are ignored'''
+        self.assertEqual(
+            signature('custom', 'Timed out after 10s'),
+            signature('custom', 'Timed out after 12s'))
+
+
+class TestFailureScanner(TestQless):
+    '''Test scanning failed jobs'''
+    def setUp(self):
+        TestQless.setUp(self)
+        for queue, klass, exception, line in [
+            ('foo', 'Foo', 'KeyError', 10),
+            ('foo', 'Foo', 'KeyError', 20),
+            ('foo', 'Bar', 'ValueError', 10),
+            ('bar', 'Foo', 'KeyError', 10)]:
+            self.client.queues[queue].put(klass, {})
+            self.client.queues[queue].pop().fail(
+                queue + '-' + exception, traceback(exception, line))
+
+    def test_scan(self):
+        '''Summarizes all the failed jobs'''
+        summary = qless.FailureScanner(self.client, count=1).scan()
+        self.assertEqual(summary.total, 4)
+        self.assertEqual(summary.groups,
+            {'foo-KeyError': 2, 'foo-ValueError': 1, 'bar-KeyError': 1})
+        self.assertEqual(summary.exceptions, {'KeyError': 3, 'ValueError': 1})
+        self.assertEqual(summary.klasses, {'Foo': 3, 'Bar': 1})
+        self.assertEqual(summary.queues, {'foo': 3, 'bar': 1})
+        self.assertEqual(sorted(summary.signatures.values()), [1, 3])
+        self.assertEqual(len(summary.examples), 2)
+
+    def test_groups(self):
+        '''Can summarize only some groups'''
+        summary = qless.FailureScanner(
+            self.client, groups=['foo-KeyError']).scan()
+        self.assertEqual(summary.total, 2)
+        self.assertEqual(list(summary.signatures.values()), [2])
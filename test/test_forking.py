@@ -3,13 +3,16 @@
 # Internal imports
 from common import TestQless
 
+import gc
 import os
 import time
 import signal
+import sys
 import threading
 
 # The stuff we're actually testing
 import qless
+from qless.job import BaseJob
 from qless.workers import Worker
 from qless.workers.forking import ForkingWorker
 
@@ -84,3 +87,42 @@ class TestWorker(TestQless):
     def test_spawn(self):
         '''It gives us back a worker instance'''
         self.assertIsInstance(self.worker.spawn(), Worker)
+
+    def test_preload(self):
+        '''It imports the job classes and modules to preload, skipping those
+        that fail'''
+        worker = PatchedForkingWorker(['foo'], self.client,
+            preload=['test_forking.CWD', 'colorsys', 'not.a.module'])
+        BaseJob._loaded.pop('test_forking.CWD', None)
+        sys.modules.pop('colorsys', None)
+        try:
+            worker.load()
+            self.assertIn('test_forking.CWD', BaseJob._loaded)
+            self.assertIn('colorsys', sys.modules)
+            if hasattr(gc, 'freeze'):
+                self.assertGreater(gc.get_freeze_count(), 0)
+        finally:
+            if hasattr(gc, 'unfreeze'):
+                gc.unfreeze()
+
+    def test_preload_not_spawned(self):
+        '''Children aren't asked to preload'''
+        worker = PatchedForkingWorker(['foo'], self.client,
+            preload=['test_forking.CWD'])
+        self.assertEqual(worker.preload, ['test_forking.CWD'])
+        self.assertNotIn('preload', worker.kwargs)
+
+    def test_limits(self):
+        '''Children's limits are staggered around those given'''
+        worker = PatchedForkingWorker(['foo'], self.client, workers=4,
+            max_jobs_per_child=1000, max_rss_per_child=1000)
+        limits = [worker.limits(index) for index in range(4)]
+        self.assertEqual([limit['max_jobs'] for limit in limits],
+            [925, 975, 1025, 1075])
+        self.assertEqual([limit['max_rss'] for limit in limits],
+            [925, 975, 1025, 1075])
+        self.assertNotIn('max_jobs_per_child', worker.kwargs)
+
+    def test_no_limits(self):
+        '''Children have no limits unless they're given'''
+        self.assertEqual(self.worker.limits(0), {})
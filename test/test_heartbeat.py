@@ -0,0 +1,115 @@
+'''Test heartbeating jobs on behalf of workers'''
+
+# Internal imports
+from common import TestQless
+
+import mock
+import signal
+
+# The stuff we're actually testing
+from qless.workers import Worker
+from qless.workers.serial import SerialWorker
+from qless.workers.heartbeat import Heartbeater
+
+
+class TestHeartbeater(TestQless):
+    '''Test the heartbeater'''
+    def setUp(self):
+        TestQless.setUp(self)
+        self.worker = Worker(['foo'], self.client, heartbeat=True)
+        self.worker.kill = mock.Mock()
+        self.heartbeater = Heartbeater(self.worker, interval=60)
+        self.queue = self.client.queues['foo']
+
+    def tearDown(self):
+        self.heartbeater.stop()
+        TestQless.tearDown(self)
+
+    def test_renew(self):
+        '''Heartbeats jobs that have used up enough of their locks'''
+        self.queue.put('Foo', {})
+        self.queue.put('Foo', {})
+        due, fresh = self.queue.pop(2)
+        self.heartbeater.add(due)
+        self.heartbeater.add(fresh)
+        # Pretend that one has used up most of its lock
+        due.expires_at -= 50
+        expires_at = fresh.expires_at
+        with mock.patch.object(due, '_encoded_data') as data:
+            self.heartbeater.renew()
+            self.assertFalse(data.called)
+        self.assertGreater(due.ttl, 50)
+        self.assertEqual(fresh.expires_at, expires_at)
+
+    def test_lost(self):
+        '''Kills jobs we've lost the lock on'''
+        self.queue.put('Foo', {})
+        job = self.queue.pop()
+        self.heartbeater.add(job)
+        job.expires_at -= 50
+        job.timeout()
+        self.heartbeater.renew()
+        self.worker.kill.assert_called_with(job.jid)
+        # We've stopped heartbeating it
+        self.worker.kill.reset_mock()
+        self.heartbeater.renew()
+        self.assertFalse(self.worker.kill.called)
+
+    def test_working(self):
+        '''Workers heartbeat jobs while they're working on them'''
+        self.queue.put('Foo', {})
+        job = self.queue.pop()
+        with self.worker.working(job):
+            self.assertIn(job.jid, self.worker.heartbeater._jobs)
+        self.assertNotIn(job.jid, self.worker.heartbeater._jobs)
+        self.worker.heartbeater.stop()
+
+    def test_finished(self):
+        '''Jobs finished since they were last heartbeated aren't lost'''
+        self.queue.put('Foo', {})
+        job = self.queue.pop()
+        self.heartbeater.add(job)
+        job.expires_at -= 50
+        job.complete()
+        self.heartbeater.renew()
+        self.assertFalse(self.worker.kill.called)
+        self.assertNotIn(job.jid, self.heartbeater._jobs)
+
+    def test_kill_errors(self):
+        '''Errors killing a job don't stop the heartbeater'''
+        self.queue.put('Foo', {})
+        job = self.queue.pop()
+        self.heartbeater.add(job)
+        job.expires_at -= 50
+        job.timeout()
+        self.worker.kill.side_effect = ValueError('boom')
+        self.heartbeater.renew()
+        self.worker.kill.assert_called_with(job.jid)
+
+    def test_serial_lose(self):
+        '''Serial workers kill lost jobs on the main thread'''
+        worker = SerialWorker(['foo'], self.client)
+        worker.jid = 'jid'
+        with mock.patch('os.kill') as kill:
+            worker.lose('other')
+            self.assertFalse(kill.called)
+            worker.lose('jid')
+            kill.assert_called_once_with(mock.ANY, signal.SIGURG)
+        self.assertEqual(worker.lost, 'jid')
+
+    def test_finish(self):
+        '''Workers stop heartbeating when they finish'''
+        self.queue.put('Foo', {})
+        with self.worker.working(self.queue.pop()):
+            pass
+        self.worker.finish()
+        self.assertTrue(self.worker.heartbeater._stopped.is_set())
+        self.assertFalse(self.worker.heartbeater._thread.is_alive())
+
+    def test_buffered(self):
+        '''Renews the locks of the jobs the worker has buffered'''
+        heartbeater = Heartbeater(self.worker, interval=0)
+        with mock.patch.object(self.worker, 'renew',
+            side_effect=lambda: heartbeater._stopped.set()) as renew:
+            heartbeater.run()
+            renew.assert_called_once_with()
@@ -3,6 +3,7 @@
 import sys
 from six import PY3
 import mock
+import simplejson as json
 
 from common import TestQless
 from qless.job import Job, BaseJob
@@ -103,6 +104,48 @@ class TestJob(TestQless):
         job['foo'] = 'bar'
         self.assertEqual(job['foo'], 'bar')
 
+    def test_arbitrary_attributes(self):
+        '''Attributes beyond the known ones can still be set'''
+        self.client.queues['foo'].put('Foo', {}, jid='jid')
+        job = self.client.jobs['jid']
+        job.sandbox = 'sandbox'
+        job.foo = 'bar'
+        self.assertEqual((job.sandbox, job.foo), ('sandbox', 'bar'))
+
+    def test_lazy_data(self):
+        '''Job data is only decoded when it's accessed'''
+        self.client.queues['foo'].put('Foo', {'foo': 'bar'}, jid='jid')
+        with mock.patch.object(self.client.codecs, 'loads') as loads:
+            self.client.queues['foo'].pop().complete()
+            self.assertFalse(loads.called)
+        self.assertEqual(self.client.jobs['jid'].data, {'foo': 'bar'})
+
+    def test_lazy_data_dropped(self):
+        '''Only the encoded data is kept, and only until it's decoded'''
+        self.client.queues['foo'].put('Foo', {'foo': 'bar'}, jid='jid')
+        job = self.client.jobs['jid']
+        self.assertEqual(json.loads(job._raw_data), {'foo': 'bar'})
+        self.assertEqual(job.data, {'foo': 'bar'})
+        self.assertEqual(job._raw_data, None)
+
+    def test_lazy_data_undecodable(self):
+        '''Job data that can't be decoded is kept as it was'''
+        self.client.queues['foo'].put('Foo', {'foo': 'bar'}, jid='jid')
+        job = self.client.queues['foo'].pop()
+        with mock.patch.object(self.client.codecs, 'loads',
+            side_effect=ValueError):
+            self.assertRaises(ValueError, getattr, job, 'data')
+        job.complete()
+        self.assertEqual(self.client.jobs['jid'].data, {'foo': 'bar'})
+
+    def test_lazy_data_replaced(self):
+        '''Replacing job data before it's decoded uses the new data'''
+        self.client.queues['foo'].put('Foo', {'foo': 'bar'}, jid='jid')
+        job = self.client.queues['foo'].pop()
+        job.data = {'whiz': 'bang'}
+        job.complete()
+        self.assertEqual(self.client.jobs['jid'].data, {'whiz': 'bang'})
+
     def test_move(self):
         '''Able to move jobs through the move method'''
         self.client.queues['foo'].put('Foo', {}, jid='jid')
@@ -1,5 +1,8 @@
 '''Basic tests about the Job class'''
 
+import mock
+
+import qless
 from common import TestQless
 
 
@@ -15,6 +18,21 @@ class TestQueue(TestQless):
         self.assertEqual(queue.jobs.scheduled(), [])
         self.assertEqual(queue.jobs.recurring(), [])
 
+    def test_iter_jobs(self):
+        '''Can iterate over all the jobs in each state'''
+        queue = self.client.queues['foo']
+        jids = [queue.put('Foo', {}, delay=60) for _ in range(5)]
+        self.assertEqual(
+            set(queue.jobs.iter_scheduled(count=2)), set(jids))
+        self.assertEqual(
+            set(job.jid for job in queue.jobs.iter_scheduled(2, True)),
+            set(jids))
+        self.assertEqual(list(queue.jobs.iter_running()), [])
+        queue.recur('Foo', {}, 60, jid='recurring')
+        self.assertEqual(
+            [job.jid for job in queue.jobs.iter_recurring(hydrate=True)],
+            ['recurring'])
+
     def test_counts(self):
         '''Provides access to job counts'''
         self.client.queues['foo'].put('Foo', {})
@@ -49,6 +67,45 @@ class TestQueue(TestQless):
         '''Raises an attribute error if there is no attribute'''
         self.assertRaises(AttributeError, lambda: self.client.queues['foo'].foo)
 
+    def test_put_many(self):
+        '''Can put many jobs in chunks'''
+        queue = self.client.queues['foo']
+        jids = list(queue.put_many('Foo', ({'i': i} for i in range(5)),
+            chunk_size=2, priority=5))
+        self.assertEqual(len(jids), 5)
+        self.assertEqual(
+            [self.client.jobs[jid]['i'] for jid in jids], list(range(5)))
+        self.assertEqual(
+            set(self.client.jobs[jid].priority for jid in jids), set([5]))
+
+    def test_put_many_overrides(self):
+        '''Options for individual jobs override the defaults'''
+        queue = self.client.queues['foo']
+        jids = list(queue.put_many('Foo', [
+            {}, ({}, {'jid': 'jid', 'tags': ['foo'], 'priority': 10})],
+            priority=5))
+        self.assertEqual(jids[1], 'jid')
+        job = self.client.jobs['jid']
+        self.assertEqual((job.priority, job.tags), (10, ['foo']))
+        self.assertEqual(self.client.jobs[jids[0]].priority, 5)
+
+    def test_put_many_failed(self):
+        '''The jids of the jobs that were put come before the first error'''
+        queue = self.client.queues['foo']
+        encoded = ['{}', 'not json', '{}', '{}']
+        with mock.patch.object(
+            self.client.codecs, 'dumps', side_effect=encoded):
+            jids = queue.put_many('Foo', [{}] * 4, chunk_size=3)
+            self.assertEqual(len([next(jids), next(jids)]), 2)
+            self.assertRaises(qless.QlessException, next, jids)
+        self.assertEqual(len(queue), 2)
+
+    def test_put_many_lazy(self):
+        '''Nothing is put until the jids are consumed'''
+        queue = self.client.queues['foo']
+        queue.put_many('Foo', [{}] * 5)
+        self.assertEqual(len(queue), 0)
+
     def test_multipop(self):
         '''Exposes multi-pop'''
         self.client.queues['foo'].put('Foo', {})
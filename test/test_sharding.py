@@ -0,0 +1,132 @@
+'''Tests about the sharded client'''
+
+import mock
+import redis
+from six import next
+
+import qless
+from common import TestQless
+from qless.sharding import Ring
+from qless.workers import Worker
+
+
+class TestRing(TestQless):
+    '''Test the consistent hash ring'''
+    def test_consistent(self):
+        '''Adding a node only moves some of the keys'''
+        before = Ring([(name, name) for name in 'abc'])
+        after = Ring([(name, name) for name in 'abcd'])
+        keys = ['key-%i' % index for index in range(1000)]
+        moved = [key for key in keys if before[key] != after[key]]
+        self.assertLess(len(moved), 500)
+        self.assertEqual(set(after[key] for key in moved), set(['d']))
+
+    def test_balanced(self):
+        '''Keys are spread across all the nodes'''
+        ring = Ring([(name, name) for name in 'abc'])
+        keys = ['key-%i' % index for index in range(1000)]
+        self.assertEqual(set(ring[key] for key in keys), set('abc'))
+
+
+class TestShardedClient(TestQless):
+    '''Test the sharded client'''
+    urls = ['redis://localhost:6379/1', 'redis://localhost:6379/2']
+
+    def setUp(self):
+        TestQless.setUp(self)
+        self.sharded = qless.ShardedClient(self.urls, hostname='worker')
+        # Find a queue name on each of the shards
+        self.names = {}
+        for index in range(100):
+            name = 'queue-%i' % index
+            self.names.setdefault(id(self.sharded.shard(name)), name)
+        self.names = sorted(self.names.values())
+
+    def tearDown(self):
+        for url in self.urls:
+            redis.Redis.from_url(url).flushdb()
+        TestQless.tearDown(self)
+
+    def test_colocated(self):
+        '''Jobs live on the same shard as their queue'''
+        for name in self.names:
+            jid = self.sharded.queues[name].put('Foo', {})
+            self.assertNotEqual(self.sharded.shard(name).jobs[jid], None)
+        self.assertEqual(len(self.names), 2)
+
+    def test_jobs(self):
+        '''Can find jobs on any shard'''
+        jids = [self.sharded.queues[name].put('Foo', {}) for name in self.names]
+        self.assertEqual(self.sharded.jobs['nonexistent'], None)
+        for jid in jids:
+            self.assertEqual(self.sharded.jobs[jid].jid, jid)
+        self.assertEqual(
+            [job.jid for job in self.sharded.jobs.get(*jids)], jids)
+        flush = qless.Batch.flush
+        with mock.patch.object(qless.Batch, 'flush', autospec=True,
+            side_effect=flush) as flushed:
+            self.assertEqual(
+                [job and job.jid for job in self.sharded.jobs.lookup(
+                    'nonexistent', *jids)], [None] + jids)
+            self.assertEqual(flushed.call_count, len(self.urls))
+
+    def test_advance(self):
+        '''Jobs advanced to a queue on another shard are put there'''
+        source, target = self.names
+        jid = self.sharded.queues[source].put('Foo', {'foo': 'bar'},
+            priority=5, tags=['tag'])
+        job = self.sharded.queues[source].pop()
+        job.complete(target)
+        self.assertIs(job.client, self.sharded.shard(target))
+        self.assertEqual(
+            self.sharded.shard(source).jobs[jid].state, 'complete')
+        self.assertEqual(self.sharded.jobs[jid].state, 'waiting')
+        job = self.sharded.queues[target].pop()
+        self.assertEqual((job.jid, job.data), (jid, {'foo': 'bar'}))
+
+    def test_move(self):
+        '''Jobs moved to a queue on another shard are taken off this one'''
+        source, target = self.names
+        jid = self.sharded.queues[source].put('Foo', {})
+        self.sharded.jobs[jid].move(target)
+        self.assertEqual(self.sharded.shard(source).jobs[jid], None)
+        self.assertEqual(self.sharded.queues[target].pop().jid, jid)
+
+    def test_advance_failed(self):
+        '''Jobs that can't be completed aren't advanced to another shard'''
+        source, target = self.names
+        jid = self.sharded.queues[source].put('Foo', {})
+        job = self.sharded.queues[source].pop()
+        self.sharded.shard(source).jobs[jid].timeout()
+        self.assertRaises(qless.QlessException, job.complete, target)
+        self.assertEqual(self.sharded.shard(target).jobs[jid], None)
+
+    def test_counts(self):
+        '''Queue and worker counts include every shard'''
+        for name in self.names:
+            self.sharded.queues[name].put('Foo', {})
+            self.sharded.queues[name].pop()
+        self.assertEqual(
+            sorted(queue['name'] for queue in self.sharded.queues.counts),
+            self.names)
+        self.assertEqual(self.sharded.workers.counts,
+            [{'name': 'worker', 'jobs': 2, 'stalled': 0}])
+        self.assertEqual(len(self.sharded.workers['worker']['jobs']), 2)
+
+    def test_failed(self):
+        '''Failure counts include every shard'''
+        for name in self.names:
+            self.sharded.queues[name].put('Foo', {})
+            self.sharded.queues[name].pop().fail('foo', 'bar')
+        self.assertEqual(self.sharded.jobs.failed(), {'foo': 2})
+
+    def test_worker(self):
+        '''Workers pop from the shard for each queue'''
+        jids = [self.sharded.queues[name].put('Foo', {}) for name in self.names]
+        worker = Worker(self.names, self.sharded)
+        jobs = worker.jobs()
+        self.assertEqual(
+            sorted([next(jobs).jid, next(jobs).jid]), sorted(jids))
+        worker = Worker(self.names, self.sharded, resume=True)
+        self.assertEqual(
+            sorted(job.jid for job in worker.resume), sorted(jids))
@@ -0,0 +1,91 @@
+'''Test the thread pool worker'''
+
+# Internal imports
+from common import TestQless
+
+import time
+import threading
+from six import next
+
+# The stuff we're actually testing
+from qless.workers.threaded import ThreadPoolWorker
+
+
+class ThreadJob(object):
+    '''Dummy class'''
+    @staticmethod
+    def foo(job):
+        '''Dummy job'''
+        job.data['sandbox'] = job.sandbox
+        job.data['thread'] = threading.current_thread().name
+        time.sleep(job.data.get('sleep', 0))
+        job.complete()
+
+
+class LimitedThreadPoolWorker(ThreadPoolWorker):
+    '''A worker that limits the number of jobs it runs'''
+    def jobs(self):
+        '''Yield only a few jobs'''
+        generator = ThreadPoolWorker.jobs(self)
+        for _ in range(5):
+            yield next(generator)
+
+    def listen(self, _):
+        '''Don't actually listen for pubsub events'''
+        pass
+
+    def signals(self):
+        '''Do not set any signal handlers'''
+        pass
+
+
+class TestWorker(TestQless):
+    '''Test the worker'''
+    def setUp(self):
+        TestQless.setUp(self)
+        self.worker = LimitedThreadPoolWorker(
+            ['foo'], self.client, threads=1, interval=0.2)
+        self.queue = self.client.queues['foo']
+
+    def test_basic(self):
+        '''Can complete jobs in a basic way'''
+        jids = [self.queue.put(ThreadJob, {}) for _ in range(5)]
+        self.worker.run()
+        states = [self.client.jobs[jid].state for jid in jids]
+        self.assertEqual(states, ['complete'] * 5)
+        sandboxes = [self.client.jobs[jid].data['sandbox'] for jid in jids]
+        for sandbox in sandboxes:
+            self.assertIn('qless-py-workers/thread-0', sandbox)
+
+    def test_concurrent(self):
+        '''Runs jobs concurrently on its threads'''
+        jids = [self.queue.put(ThreadJob, {'sleep': 0.2}) for _ in range(5)]
+        worker = LimitedThreadPoolWorker(
+            ['foo'], self.client, threads=5, interval=0.2)
+        before = time.time()
+        worker.run()
+        self.assertLess(time.time() - before, 0.8)
+        threads = set(self.client.jobs[jid].data['thread'] for jid in jids)
+        self.assertEqual(len(threads), 5)
+
+    def test_sleeps(self):
+        '''Make sure the client sleeps if there aren't jobs to be had'''
+        for _ in range(4):
+            self.queue.put(ThreadJob, {})
+        before = time.time()
+        self.worker.run()
+        self.assertGreater(time.time() - before, 0.2)
+
+    def test_kill(self):
+        '''Tells jobs to stop when it loses their locks'''
+        self.queue.put(ThreadJob, {})
+        job = self.queue.pop()
+        job.killed = threading.Event()
+        self.worker.running[job.jid] = job
+        self.worker.kill(job.jid)
+        self.assertTrue(job.killed.is_set())
+
+    def test_kill_dead(self):
+        '''Does not panic if the job is no longer around'''
+        # This test succeeds if it finishes without an exception
+        self.worker.kill('foo')
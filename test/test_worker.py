@@ -8,7 +8,10 @@ from qless.workers import Worker
 
 # External dependencies
 import os
+import mock
+import time
 import itertools
+import simplejson as json
 from six import next
 
 
@@ -80,6 +83,66 @@ class TestWorker(TestQless):
                 self.assertEqual(os.listdir(path), [])
         os.rmdir(path)
 
+    def test_lazy_sandbox(self):
+        '''A lazy sandbox is only cleaned once it's been used'''
+        path = 'test/tmp/foo'
+        with Worker.sandbox(path, 'lazy'):
+            self.assertEqual(os.listdir(path), [])
+        with mock.patch.object(Worker, 'clean') as clean:
+            with Worker.sandbox(path, 'lazy'):
+                pass
+            self.assertFalse(clean.called)
+        with Worker.sandbox(path, 'lazy'):
+            os.makedirs(os.path.join(path, 'whiz'))
+            with open(os.path.join(path, 'whiz', 'bang'), 'w+'):
+                pass
+        self.assertEqual(os.listdir(path), [])
+        os.rmdir(path)
+
+    def test_lazy_sandbox_dirty(self):
+        '''A lazy sandbox that's dirty on arrival is cleaned first'''
+        path = 'test/tmp/foo'
+        os.makedirs(path)
+        with open(os.path.join(path, 'whiz'), 'w+'):
+            pass
+        with Worker.sandbox(path, 'lazy'):
+            self.assertEqual(os.listdir(path), [])
+        os.rmdir(path)
+
+    def test_async_sandbox(self):
+        '''A used async sandbox is replaced, and deleted in the background'''
+        path = 'test/tmp/foo'
+        with Worker.sandbox(path, 'async'):
+            for name in ['whiz', 'widget', 'bang']:
+                with open(os.path.join(path, name), 'w+'):
+                    pass
+        self.assertEqual(os.listdir(path), [])
+        Worker._trash.join()
+        self.assertEqual(os.listdir('test/tmp'), ['foo'])
+        os.rmdir(path)
+
+    def test_async_sandbox_cwd(self):
+        '''If we're working in an async sandbox, we keep working in it'''
+        path = os.path.abspath('test/tmp/foo')
+        cwd = os.getcwd()
+        try:
+            with Worker.sandbox(path, 'async'):
+                os.chdir(path)
+                with open('whiz', 'w+'):
+                    pass
+            self.assertEqual(os.getcwd(), os.path.realpath(path))
+            self.assertEqual(os.listdir('.'), [])
+        finally:
+            os.chdir(cwd)
+        Worker._trash.join()
+        os.rmdir(path)
+
+    def test_sandbox_mode(self):
+        '''An unknown sandbox mode is an error'''
+        with self.assertRaises(qless.QlessException):
+            with Worker.sandbox('test/tmp/foo', 'sometimes'):
+                pass
+
     def test_resume(self):
         '''We should be able to resume jobs'''
         queue = self.worker.client.queues['foo']
@@ -117,6 +180,170 @@ class TestWorker(TestQless):
         jids = [job.jid for job in worker.resume]
         self.assertEqual(jids, [jid])
 
+    def test_notify(self):
+        '''Jobs put in our queues wake us up'''
+        def message(queue, event='put'):
+            '''A log message about an event for a job in a queue'''
+            return {'channel': 'ql:log', 'data': json.dumps(
+                {'jid': 'jid', 'event': event, 'queue': queue})}
+        listener = mock.Mock()
+        listener.listen.return_value = [
+            message('bar'), message('foo', 'popped')]
+        self.worker.listen(listener)
+        self.assertFalse(self.worker.available.is_set())
+        listener.listen.return_value = [message('foo')]
+        self.worker.listen(listener)
+        self.assertTrue(self.worker.available.is_set())
+        # We don't wait, and the next pass of looking for jobs clears it
+        before = time.time()
+        self.worker.wait(10)
+        self.assertLess(time.time() - before, 1)
+        self.assertEqual(next(self.worker.jobs()), None)
+        self.assertFalse(self.worker.available.is_set())
+
+    def test_notify_channel(self):
+        '''Only subscribes to the log when asked to'''
+        with mock.patch('qless.workers.Listener') as listener:
+            with self.worker.listener():
+                pass
+            self.assertEqual(listener.call_args[0][1], ['ql:w:' +
+                self.client.worker_name])
+            worker = Worker(['foo'], self.client, notify=True)
+            with worker.listener():
+                pass
+            self.assertIn('ql:log', listener.call_args[0][1])
+
+    def test_pop_each(self):
+        '''Pops from each of its queues in turn by default'''
+        jids = [self.client.queues[name].put('Foo', {})
+            for name in ('foo', 'bar')]
+        worker = Worker(['foo', 'bar'], self.client)
+        jobs = worker.jobs()
+        self.assertEqual(next(jobs).jid, jids[0])
+        self.assertEqual(self.client.jobs[jids[1]].state, 'waiting')
+        self.assertEqual(next(jobs).jid, jids[1])
+
+    def test_pop_many(self):
+        '''Pops from all of its queues at once, with a strategy'''
+        for name in ('foo', 'bar'):
+            self.client.queues[name].put('Foo', {})
+        worker = Worker(['foo', 'bar'], self.client, strategy='round-robin')
+        with mock.patch.object(qless.Queue, 'pop') as pop:
+            jobs = worker.jobs()
+            self.assertEqual(
+                set([next(jobs).queue_name, next(jobs).queue_name]),
+                set(['foo', 'bar']))
+            self.assertEqual(next(jobs), None)
+            self.assertFalse(pop.called)
+
+    def test_pop_many_release(self):
+        '''Jobs popped from all of its queues at once are put back'''
+        jids = [self.client.queues[name].put('Foo', {})
+            for name in ('foo', 'bar')]
+        worker = Worker(['foo', 'bar'], self.client, strategy='priority')
+        jobs = worker.jobs()
+        self.assertEqual(next(jobs).jid, jids[0])
+        self.assertEqual(
+            [entry[0].jid for entry in worker.buffers[None]], jids[1:])
+        jobs.close()
+        self.assertEqual(self.client.jobs[jids[1]].state, 'waiting')
+
+    def test_prefetch(self):
+        '''Pops several jobs at once, and hands them out one at a time'''
+        jids = [self.client.queues['foo'].put('Foo', {}) for _ in range(5)]
+        worker = Worker(['foo'], self.client, prefetch=3)
+        jobs = worker.jobs()
+        self.assertEqual(next(jobs).jid, jids[0])
+        self.assertEqual(
+            [job.state for job in self.client.jobs.get(*jids)],
+            ['running'] * 3 + ['waiting'] * 2)
+        with mock.patch.object(self.client.queues['foo'], 'pop') as pop:
+            self.assertEqual(next(jobs).jid, jids[1])
+            self.assertFalse(pop.called)
+
+    def test_prefetch_release(self):
+        '''Prefetched jobs are put back when we're done'''
+        jids = [self.client.queues['foo'].put('Foo', {}) for _ in range(5)]
+        worker = Worker(['foo'], self.client, prefetch=3)
+        jobs = worker.jobs()
+        next(jobs)
+        jobs.close()
+        self.assertEqual(
+            [job.state for job in self.client.jobs.get(*jids)],
+            ['running'] + ['waiting'] * 4)
+
+    def test_prefetch_release_retries(self):
+        '''Prefetched jobs keep their priority, tags and retries left'''
+        queue = self.client.queues['foo']
+        jids = [queue.put('Foo', {}, priority=5, tags=['tag'], retries=2)
+            for _ in range(2)]
+        worker = Worker(['foo'], self.client, prefetch=2)
+        jobs = worker.jobs()
+        next(jobs)
+        pending = worker.buffers['foo'][0][0]
+        with mock.patch.object(qless.Batch, '__call__') as batch:
+            jobs.close()
+        args = batch.call_args[0]
+        self.assertEqual(args[:3], ('put', 'foo', jids[1]))
+        options = dict(zip(args[6::2], args[7::2]))
+        self.assertEqual(options['priority'], pending.priority)
+        self.assertEqual(json.loads(options['tags']), pending.tags)
+        self.assertEqual(options['retries'], pending.retries_left)
+        self.assertEqual(json.loads(options['depends']), [])
+
+    def test_prefetch_release_retried(self):
+        '''Prefetched jobs that have been retried don't get retries back'''
+        queue = self.client.queues['foo']
+        jids = [queue.put('Foo', {}, retries=2) for _ in range(2)]
+        queue.pop().retry()
+        worker = Worker(['foo'], self.client, prefetch=2)
+        jobs = worker.jobs()
+        self.assertEqual(next(jobs).jid, jids[1])
+        jobs.close()
+        job = self.client.jobs[jids[0]]
+        self.assertEqual((job.state, job.retries_left), ('waiting', 1))
+
+    def test_prefetch_background(self):
+        '''Prefetched jobs are heartbeated in the background'''
+        self.client.queues['foo'].put('Foo', {})
+        worker = Worker(['foo'], self.client, prefetch=3)
+        self.assertFalse(worker.heartbeat)
+        with mock.patch.object(worker.heartbeater, 'start') as start:
+            next(worker.jobs())
+            start.assert_called_once_with()
+
+    def test_prefetch_renew(self):
+        '''Prefetched jobs are heartbeated, and dropped if they're lost'''
+        jids = [self.client.queues['foo'].put('Foo', {}) for _ in range(3)]
+        worker = Worker(['foo'], self.client, prefetch=3)
+        jobs = worker.jobs()
+        next(jobs)
+        # Pretend they've used up most of their locks, and lose one
+        for entry in worker.buffers['foo']:
+            entry[1] *= 10
+        self.client.jobs[jids[1]].timeout()
+        worker.renew()
+        self.assertEqual(
+            [entry[0].jid for entry in worker.buffers['foo']], jids[2:])
+
+    def test_max_jobs(self):
+        '''Stops once it has worked on enough jobs'''
+        jids = [self.client.queues['foo'].put('Foo', {}) for _ in range(3)]
+        worker = Worker(['foo'], self.client, max_jobs=2)
+        self.assertEqual([job.jid for job in worker.jobs()], jids[:2])
+        self.assertTrue(worker.shutdown)
+
+    def test_max_rss(self):
+        '''Stops once it has grown too large'''
+        self.client.queues['foo'].put('Foo', {})
+        worker = Worker(['foo'], self.client, max_rss=100)
+        with mock.patch('qless.util.rss', return_value=50):
+            jobs = worker.jobs()
+            self.assertIsInstance(next(jobs), qless.Job)
+        with mock.patch('qless.util.rss', return_value=100):
+            self.assertEqual(list(jobs), [])
+        self.assertTrue(worker.shutdown)
+
     def test_divide(self):
         '''We should be able to divide resumable jobs evenly'''
         items = self.worker.divide(range(100), 7)